@@ -0,0 +1,152 @@
+import os
+import random
+import hashlib
+import argparse
+
+# 生成可复现的合成 Ren'Py 项目：game/ 下的源脚本，以及 game/tl/<语言> 下与之对应的翻译文件。
+# 相同的参数和随机种子总是生成逐字节相同的项目。
+
+CHARACTERS = ["e", "m", "s", ""]  # 空字符串表示旁白
+WORDS = ("the quick brown fox jumps over lazy dog rain window letter station morning "
+         "promise silence garden river shadow lantern whisper coffee evening memory").split()
+VARIABLES = ["flag", "met_sylvie", "affection", "day", "route", "chapter"]
+OPERATORS = ["", " > 1", " == 2", " < 3", " >= 5"]
+
+
+def random_text(rng, line_length, repeat_ratio):
+    """按 (最短, 众数, 最长) 的三角分布生成一行文本；按 repeat_ratio 的概率返回重复出现的常见文本。"""
+    if rng.random() < repeat_ratio:
+        return rng.choice(["...", "Hmm.", "Yes.", "I see."])
+    low, mode, high = line_length
+    target = max(1, int(rng.triangular(low, high, mode)))
+    words = []
+    size = 0
+    while size < target:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    text = " ".join(words)[:target].strip() or "..."
+    if rng.random() < 0.05:
+        # 少量带转义引号的文本
+        text = f'\\"{text}\\"'
+    return text
+
+
+def random_condition(rng):
+    return rng.choice(VARIABLES) + rng.choice(OPERATORS)
+
+
+def generate_script(rng, file_index, blocks, depth, line_length, repeat_ratio):
+    """生成一个源脚本，返回 (各行, [(行号, 角色, 文本), ...])，行号从 1 开始。"""
+    lines = [f"label file_{file_index}:"]
+    dialogues = []
+
+    def say(indent):
+        who = rng.choice(CHARACTERS)
+        text = random_text(rng, line_length, repeat_ratio)
+        lines.append(" " * indent + (f'{who} "{text}"' if who else f'"{text}"'))
+        dialogues.append((len(lines), who, text))
+
+    def body(indent, level):
+        # 每个分支至少有一条语句
+        for _ in range(rng.randint(1, 3)):
+            if level < depth and rng.random() < 0.3:
+                chain(indent, level + 1)
+            else:
+                say(indent)
+
+    def chain(indent, level):
+        lines.append(" " * indent + f"if {random_condition(rng)}:")
+        body(indent + 4, level)
+        for _ in range(rng.randint(0, 2)):
+            lines.append(" " * indent + f"elif {random_condition(rng)}:")
+            body(indent + 4, level)
+        if rng.random() < 0.5:
+            lines.append(" " * indent + "else:")
+            body(indent + 4, level)
+
+    while len(dialogues) < blocks:
+        if depth > 0 and rng.random() < 0.3:
+            chain(4, 1)
+        else:
+            say(4)
+    lines.append("    return")
+    return lines, dialogues
+
+
+def generate_translation(file_name, dialogues, language):
+    """生成与源脚本对应的翻译文件，译文初始为原文（与 Ren'Py 生成的翻译文件一致）。"""
+    lines = ["# TODO: Translation updated at 2024-01-01 00:00", ""]
+    for line_number, who, text in dialogues:
+        digest = hashlib.md5(f"{file_name}:{line_number}:{who}:{text}".encode("utf-8")).hexdigest()[:8]
+        say = f'{who} "{text}"' if who else f'"{text}"'
+        lines += [
+            f"# game/{file_name}:{line_number}",
+            f"translate {language} {os.path.splitext(file_name)[0]}_{digest}:",
+            "",
+            f"    # {say}",
+            f"    {say}",
+            "",
+        ]
+    return lines
+
+
+def generate_strings(rng, count, language, line_length):
+    """生成一个含 count 条 old/new 的 translate strings 块，模拟 common.rpy 一类的字符串表。"""
+    lines = [f"translate {language} strings:", ""]
+    for index in range(count):
+        text = f"{random_text(rng, line_length, 0.0)} {index}"
+        lines += [f"    # game/screens.rpy:{index + 1}", f'    old "{text}"', f'    new "{text}"', ""]
+    return lines
+
+
+def write_lines(path, lines):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def generate_project(root, files=10, blocks=100, strings=200, depth=3, line_length=(10, 40, 120),
+                     language="chinese", repeat_ratio=0.05, seed=0):
+    """
+    在 root 下生成合成项目。
+    files 为源脚本数，blocks 为每个脚本的对话数，strings 为字符串表的条目数，
+    depth 为 if/elif/else 的最大嵌套层数，line_length 为文本长度的 (最短, 众数, 最长)。
+    返回生成的统计信息。
+    """
+    rng = random.Random(seed)
+    total_dialogues = 0
+    for file_index in range(files):
+        file_name = f"script_{file_index:04d}.rpy"
+        lines, dialogues = generate_script(rng, file_index, blocks, depth, line_length, repeat_ratio)
+        write_lines(os.path.join(root, "game", file_name), lines)
+        write_lines(os.path.join(root, "game", "tl", language, file_name), generate_translation(file_name, dialogues, language))
+        total_dialogues += len(dialogues)
+    write_lines(os.path.join(root, "game", "tl", language, "common.rpy"), generate_strings(rng, strings, language, line_length))
+    return {"files": files, "dialogues": total_dialogues, "strings": strings}
+
+
+def parse_line_length(value):
+    low, mode, high = (int(part) for part in value.split(","))
+    if not 0 < low <= mode <= high:
+        raise argparse.ArgumentTypeError("需要满足 0 < 最短 <= 众数 <= 最长")
+    return low, mode, high
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成用于性能测试的合成 Ren'Py 项目。")
+    parser.add_argument("root", help="输出目录，将在其中生成 game/ 与 game/tl/<语言>/")
+    parser.add_argument("--files", type=int, default=10, help="源脚本文件数")
+    parser.add_argument("--blocks", type=int, default=100, help="每个脚本的对话数（即翻译块数）")
+    parser.add_argument("--strings", type=int, default=200, help="字符串表的条目数")
+    parser.add_argument("--depth", type=int, default=3, help="if/elif/else 的最大嵌套层数")
+    parser.add_argument("--line-length", type=parse_line_length, default=(10, 40, 120),
+                        help="文本长度的三角分布参数：最短,众数,最长（默认 10,40,120）")
+    parser.add_argument("--language", default="chinese", help="翻译语言文件夹名称")
+    parser.add_argument("--repeat-ratio", type=float, default=0.05, help="重复出现的常见文本所占比例")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    stats = generate_project(args.root, args.files, args.blocks, args.strings, args.depth, args.line_length,
+                             args.language, args.repeat_ratio, args.seed)
+    print(f"已在 {args.root} 生成 {stats['files']} 个脚本、{stats['dialogues']} 条对话、{stats['strings']} 条字符串。")
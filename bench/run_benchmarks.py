@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import importlib
+import subprocess
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_project import generate_project
+from tl_formats import TableWriter, iter_rows
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块，不记录内存峰值
+    resource = None
+
+PRESETS = {
+    "small": dict(files=20, blocks=200, strings=500, depth=3),
+    "medium": dict(files=200, blocks=500, strings=5000, depth=4),
+    "large": dict(files=1000, blocks=1000, strings=20000, depth=5),
+}
+PHASES = ["export", "import", "mark"]
+# 参与回归比较的指标，数值越大越差
+COMPARED_METRICS = ["wall_seconds", "peak_rss_mb", "peak_worker_rss_mb"]
+
+
+def peak_rss_mb(who):
+    """读取当前进程或已回收子进程的内存峰值（MB）。"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(who).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    return round(usage / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_phase(phase, language, table_file):
+    """在当前进程（项目根目录下）运行一个阶段，各阶段的输出被丢弃。"""
+    if phase == "export":
+        importlib.import_module("export").export_to_excel(
+            os.path.join("game", "tl", language), language, table_file, use_cache=False)
+    elif phase == "import":
+        importlib.import_module("import").update_rpy_translations(language)
+    elif phase == "mark":
+        importlib.import_module("mark").conditional_patch_parallel(".", table_file)
+
+
+def child_main(phase, language, result_file):
+    """子进程入口：运行一个阶段并把耗时和内存峰值写入 result_file。"""
+    table_file = f"{language}.xlsx"
+    with open(os.devnull, "w") as devnull:
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = devnull
+        try:
+            start = time.perf_counter()
+            run_phase(phase, language, table_file)
+            wall_seconds = time.perf_counter() - start
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+    with open(result_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "wall_seconds": round(wall_seconds, 4),
+            "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+            "peak_worker_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        }, f)
+
+
+def run_phase_in_child(phase, project, language):
+    """在独立的子进程中运行一个阶段，使各阶段的内存峰值互不影响。"""
+    result_file = os.path.join(project, f".bench_{phase}.json")
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--child", phase, "--language", language,
+                    "--result-file", result_file], cwd=project, check=True,
+                   stdout=subprocess.DEVNULL)
+    with open(result_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fill_translations(table_file):
+    """为导出的每一行填入新的译文，使导入阶段需要实际改写文件（不计入耗时）。"""
+    rows = list(iter_rows(table_file))
+    with TableWriter(table_file) as writer:
+        for row in rows:
+            row[2] = f"译 {row[1]}"
+            writer.append(row)
+    return len(rows)
+
+
+def run_preset(name, params, language, seed, keep):
+    project = tempfile.mkdtemp(prefix=f"renpy-bench-{name}-")
+    try:
+        stats = generate_project(project, language=language, seed=seed, **params)
+        results = {}
+        rows = None
+        for phase in PHASES:
+            result = run_phase_in_child(phase, project, language)
+            if phase == "export":
+                rows = fill_translations(os.path.join(project, f"{language}.xlsx"))
+            result["rows"] = rows
+            result["rows_per_second"] = round(rows / result["wall_seconds"], 1) if result["wall_seconds"] else None
+            results[phase] = result
+            print(f"  {phase:<7} {result['wall_seconds']:>9.3f} 秒  {result['rows_per_second'] or 0:>12.1f} 行/秒  "
+                  f"主进程 {result['peak_rss_mb']} MB  工作进程 {result['peak_worker_rss_mb']} MB")
+        return {"params": params, "seed": seed, "project": stats, "results": results}
+    finally:
+        if keep:
+            print(f"  项目保留在 {project}")
+        else:
+            shutil.rmtree(project, ignore_errors=True)
+
+
+def best_of(runs):
+    """合并同一规模的多次运行：每个指标取最好（最小）的一次，吞吐量按最短耗时重新计算。"""
+    best = runs[0]
+    for run in runs[1:]:
+        for phase, result in run["results"].items():
+            merged = best["results"][phase]
+            for metric in COMPARED_METRICS:
+                if result.get(metric) is not None and merged.get(metric) is not None:
+                    merged[metric] = min(merged[metric], result[metric])
+            merged["rows_per_second"] = round(merged["rows"] / merged["wall_seconds"], 1) if merged["wall_seconds"] else None
+    best["runs"] = len(runs)
+    return best
+
+
+def compare_with_baseline(report, baseline, threshold):
+    """与基线比较，返回超过阈值的回归描述列表。"""
+    regressions = []
+    for preset, current in report["presets"].items():
+        base = baseline.get("presets", {}).get(preset)
+        if base is None:
+            continue
+        for phase, result in current["results"].items():
+            base_result = base["results"].get(phase, {})
+            for metric in COMPARED_METRICS:
+                value, base_value = result.get(metric), base_result.get(metric)
+                if value is None or not base_value:
+                    continue
+                if value > base_value * (1 + threshold):
+                    regressions.append(f"{preset}/{phase}/{metric}: {base_value} -> {value} "
+                                       f"(+{(value / base_value - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在合成项目上测量 export、import、mark 的耗时、内存峰值和吞吐量。")
+    parser.add_argument("--preset", action="append", choices=sorted(PRESETS), help="要运行的规模，可重复指定，默认 small")
+    parser.add_argument("--language", default="chinese", help="翻译语言文件夹名称")
+    parser.add_argument("--seed", type=int, default=0, help="生成项目所用的随机种子")
+    parser.add_argument("--output", default="bench_results.json", help="结果 JSON 文件")
+    parser.add_argument("--baseline", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json"),
+                        help="基线 JSON 文件")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.25, help="相对基线变差超过该比例即视为回归（默认 0.25）")
+    parser.add_argument("--repeat", type=int, default=1, help="每个规模重复运行的次数，各指标取最好的一次以降低噪声")
+    parser.add_argument("--keep", action="store_true", help="保留生成的项目目录")
+    parser.add_argument("--child", choices=PHASES, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args.child, args.language, args.result_file)
+        return
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "presets": {},
+    }
+    for name in args.preset or ["small"]:
+        print(f"== {name} ==")
+        runs = [run_preset(name, PRESETS[name], args.language, args.seed, args.keep) for _ in range(max(1, args.repeat))]
+        report["presets"][name] = best_of(runs)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"未找到基线 {args.baseline}，跳过回归比较。")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(report, baseline, args.threshold)
+    if regressions:
+        print("性能回归：")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("与基线相比没有超过阈值的回归。")
+
+
+if __name__ == "__main__":
+    main()
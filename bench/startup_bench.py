@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 每一项都在新的解释器中执行，测量从启动到完成导入的墙钟时间
+CASES = {
+    "python (空载)": "pass",
+    "import openpyxl": "import openpyxl",
+    "import pandas": "import pandas",
+    # 旧版 import.py 的依赖组合：pandas.read_excel 底层同样使用 openpyxl
+    "pandas + openpyxl": "import pandas, openpyxl",
+    "import import.py": "import importlib; importlib.import_module('import')",
+}
+
+
+def measure(code, repeat):
+    """在子进程中重复执行 code，返回每次的耗时列表；执行失败（例如未安装该模块）时返回 None。"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            return None
+        timings.append(elapsed)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量 import.py 及其依赖的启动（导入）耗时。")
+    parser.add_argument("--repeat", type=int, default=5, help="每一项重复运行的次数")
+    args = parser.parse_args()
+
+    print(f"{'项目':<20} {'中位数(秒)':>12} {'最短(秒)':>10}")
+    for name, code in CASES.items():
+        timings = measure(code, args.repeat)
+        if timings is None:
+            print(f"{name:<20} {'不可用':>12}")
+            continue
+        print(f"{name:<20} {statistics.median(timings):>12.3f} {min(timings):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
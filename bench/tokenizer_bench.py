@@ -0,0 +1,112 @@
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rpy_tokenizer import tokenize
+
+# 旧版 export.py 中使用的正则，仅用于 --legacy 对比
+LEGACY_STRING_PATTERN = re.compile(
+    r"(#\s+game/(.*?:\d+))?\s*translate\s+\w+\s+strings:\s*(?:\s*#.*\n)?\s*(?:(#\s+.*?(/.*?:\d+))?\s*old\s*\"(.*?)\"\s*\n\s*new\s*\"(.*?)\"\s*)+"
+)
+LEGACY_INDIVIDUAL_STRING_PATTERN = re.compile(
+    r"(#\s+(.*?(/.*?:\d+)))?\s*old\s*\"(.*?)\"\s*\n\s*new\s*\"(.*?)\""
+)
+LEGACY_DIALOGUE_PATTERN = re.compile(
+    r"(#\s+game/(.*?:\d+))?\s*translate\s+\w+\s+(\w*):?\s*(?:\s*#.*?\n)?\s*(#\s*((\w+)?)\s*\"(.*?)\")(?:\s*[\r\n]+\s*(?:\w+)?\s*\"(.*?)\")?(?=\s*\n(?:#|$|translate\s+\w+\s+strings))"
+)
+
+
+def long_string_table(n):
+    """一个含 n 对 old/new 的超长 translate strings 块。"""
+    lines = ["translate chinese strings:\n", "\n"]
+    for i in range(n):
+        lines += [f"    # game/screens.rpy:{i}\n", f'    old "Menu item {i}"\n', f'    new "菜单项 {i}"\n', "\n"]
+    return lines
+
+
+def escaped_quotes(n):
+    """n 个对话块，每行都包含大量转义引号和反斜杠。"""
+    text = '\\"quoted\\" \\\\ ' * 8
+    lines = []
+    for i in range(n):
+        lines += [f"# game/script.rpy:{i}\n", f"translate chinese block_{i}:\n", "\n",
+                  f'    # e "{text}{i}"\n', f'    e "{text}{i}"\n', "\n"]
+    return lines
+
+
+def long_comment_lines(n):
+    """strings 块中的来源注释是一行很长且不含行号的路径，旧正则会在这里反复回溯。"""
+    lines = ["translate chinese strings:\n", "\n"]
+    for i in range(20):
+        lines += ["    # " + "dir/" * n + "\n", f'    old "Item {i}"\n', f'    new "条目 {i}"\n', "\n"]
+    return lines
+
+
+CASES = {
+    "long_string_table": (long_string_table, 2000),
+    "escaped_quotes": (escaped_quotes, 2000),
+    "long_comment_lines": (long_comment_lines, 500),
+}
+
+
+def run_tokenizer(lines):
+    return sum(1 for _ in tokenize(lines))
+
+
+def run_legacy(lines):
+    content = "".join(lines)
+    count = 0
+    for match in LEGACY_STRING_PATTERN.finditer(content):
+        count += sum(1 for _ in LEGACY_INDIVIDUAL_STRING_PATTERN.finditer(match.group(0)))
+    count += sum(1 for _ in LEGACY_DIALOGUE_PATTERN.finditer(content))
+    return count
+
+
+def best_time(func, lines, repeat):
+    """取多次运行中的最短耗时，降低噪声。"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在对抗性输入上测量 rpy_tokenizer 的耗时随输入规模的增长情况。")
+    parser.add_argument("--steps", type=int, default=4, help="规模翻倍的次数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模重复运行的次数")
+    parser.add_argument("--max-ratio", type=float, default=2.0,
+                        help="最大规模与最小规模的单位字节耗时之比超过该值时视为非线性，返回非零退出码")
+    parser.add_argument("--legacy", action="store_true", help="同时测量旧版正则的耗时作为对比")
+    args = parser.parse_args()
+
+    failed = False
+    for name, (generate, base) in CASES.items():
+        print(f"== {name} ==")
+        print(f"{'规模':>8} {'字节':>12} {'分词器(秒)':>12} {'微秒/KB':>10}" + (f" {'旧正则(秒)':>12}" if args.legacy else ""))
+        per_kb = []
+        for step in range(args.steps):
+            n = base * (2 ** step)
+            lines = generate(n)
+            size = sum(len(line.encode("utf-8")) for line in lines)
+            elapsed = best_time(run_tokenizer, lines, args.repeat)
+            per_kb.append(elapsed * 1e6 / (size / 1024))
+            row = f"{n:>8} {size:>12} {elapsed:>12.4f} {per_kb[-1]:>10.2f}"
+            if args.legacy:
+                row += f" {best_time(run_legacy, lines, 1):>12.4f}"
+            print(row)
+        ratio = per_kb[-1] / per_kb[0]
+        verdict = "线性" if ratio <= args.max_ratio else "非线性"
+        print(f"单位字节耗时之比（最大/最小）：{ratio:.2f} -> {verdict}\n")
+        failed = failed or ratio > args.max_ratio
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
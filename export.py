@@ -1,115 +1,418 @@
 import os
-import re
-import openpyxl
-from openpyxl.utils import get_column_letter
-import multiprocessing
+import json
+import hashlib
+import argparse
 import time
-from multiprocessing import Manager, Pool
+import pickle
+import tempfile
+from collections import namedtuple
 from tqdm import tqdm
-import concurrent.futures
-
-# 优化后的正则表达式
-STRING_PATTERN = re.compile(
-    r"(#\s+game/(.*?:\d+))?\s*translate\s+\w+\s+strings:\s*(?:\s*#.*\n)?\s*(?:(#\s+.*?(/.*?:\d+))?\s*old\s*\"(.*?)\"\s*\n\s*new\s*\"(.*?)\"\s*)+"
-)
-INDIVIDUAL_STRING_PATTERN = re.compile(
-    r"(#\s+(.*?(/.*?:\d+)))?\s*old\s*\"(.*?)\"\s*\n\s*new\s*\"(.*?)\""
-)
-DIALOGUE_PATTERN = re.compile(
-    r"(#\s+game/(.*?:\d+))?\s*translate\s+\w+\s+(\w*):?\s*(?:\s*#.*?\n)?\s*(#\s*((\w+)?)\s*\"(.*?)\")(?:\s*[\r\n]+\s*(?:\w+)?\s*\"(.*?)\")?(?=\s*\n(?:#|$|translate\s+\w+\s+strings))"
-)
-
-def extract_translation_data(rpy_file_path: str, language: str) -> list:
-    """从 .rpy 文件中提取翻译数据，用于导出。"""
+from tl_formats import TableWriter, WorkbookWriter, FORMATS, COLUMNS, DEDUP_COLUMNS, format_occurrences, normalize_row
+from tl_log import get_logger, setup_logging, add_logging_arguments, effective_level, init_worker_logging, LogBuffer, replay
+from tl_profile import Profiler, FileProfile, init_worker_profiling, worker_task, add_profiling_arguments, profiler_from_args
+from tl_shards import ShardWriter, shard_index_path
+from tl_store import TranslationStore
+from tl_schedule import plan_schedule, describe_plan, run_scheduled, add_schedule_arguments, schedule_options
+from tl_paths import list_languages
+from mark import scan_source_file, conditions_for_rows, list_source_files
+from rpy_tokenizer import tokenize_file, decode_lines, tokenize, short_location, DialogueLine, StringPair, PARSER_VERSION, \
+    MappedLines, MMAP_THRESHOLD_BYTES
+
+# 解析缓存的格式版本；与分词器的 PARSER_VERSION 一起写入缓存，任一变化都会使缓存整体失效
+CACHE_VERSION = 1
+# 已完成但还不能写入的文件在内存中最多暂存的行数，超过后暂存到临时文件（见 ReadyBuffer）
+READY_ROWS = 100000
+
+logger = get_logger("export")
+
+def extract_translation_data(rpy_file_path: str, language: str, lines: list = None, log=None) -> list:
+    """
+    从 .rpy 文件中提取翻译数据，用于导出。返回的记录按其在文件中的位置排序。
+    已经读入文件内容时可以通过 lines 传入，避免重复读取；log 默认使用模块的 logger。
+    """
+    log = log or logger
     data = []
     try:
-        with open(rpy_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-            # 匹配字符串翻译
-            for match in STRING_PATTERN.finditer(content):
-                location_prefix = match.group(2) if match.group(2) else ""
-                for individual_match in INDIVIDUAL_STRING_PATTERN.finditer(match.group(0)):
-                    # 使用 group(3) 来获取 location
-                    location = individual_match.group(3).strip() if individual_match.group(3) else location_prefix
-                    location = location.split('/')[-1] if location else ""
-                    original = individual_match.group(4).strip()
-                    translation = individual_match.group(5).strip()
-                    data.append({
-                        "Prefix": "strings",
-                        "Original": original,
-                        "Translation": translation,
-                        "Location": location,
-                        "Identifier": ""
-                    })
-
-            # 匹配对话翻译
-            for match in DIALOGUE_PATTERN.finditer(content):
-                location = match.group(2) if match.group(2) else ""
-                location = location.split('/')[-1] if location else ""
-
-                # 如果没有 location，则尝试从注释中提取
-                if not location:
-                    location_comment = match.group(1)
-                    if location_comment:
-                        location_match = re.search(r"game/(.*?:\d+)", location_comment)
-                        if location_match:
-                            location = location_match.group(1)
-
-                identifier = match.group(3) if match.group(3) else ""
-
-                prefix = match.group(6) if match.group(6) else ""
-                original = match.group(7).strip() if match.group(7) else ""
-                translation = match.group(8).strip() if match.group(8) else ""
+        records = tokenize(lines) if lines is not None else tokenize_file(rpy_file_path)[1]
+        for record in records:
+            if isinstance(record, StringPair):
+                # 匹配字符串翻译
                 data.append({
-                    "Prefix": prefix,
-                    "Original": original,
-                    "Translation": translation,
-                    "Location": location,
-                    "Identifier": identifier
+                    "Prefix": "strings",
+                    "Original": record.original.strip(),
+                    "Translation": record.translation.strip(),
+                    "Location": short_location(record.location),
+                    "Identifier": ""
+                })
+            elif isinstance(record, DialogueLine) and record.original is not None:
+                # 匹配对话翻译
+                data.append({
+                    "Prefix": record.who,
+                    "Original": record.original.strip(),
+                    "Translation": record.translation.strip() if record.translation else "",
+                    "Location": short_location(record.block.location),
+                    "Identifier": record.block.identifier
                 })
 
     except Exception as e:
-        print(f"  [ERROR] 文件: {rpy_file_path}, 发生错误: {type(e).__name__} - {e}")
+        log.error("文件: %s, 发生错误: %s - %s", rpy_file_path, type(e).__name__, e)
     return data
 
+def to_rows(data: list) -> list:
+    """将 extract_translation_data 的结果转换为 Excel 行。"""
+    # 当 prefix 为空时，不填入 narrator；第四列“特殊”留空，定位和标识写入第五、六列
+    return [[item["Prefix"], item["Original"], item["Translation"], "", item["Location"], item["Identifier"]] for item in data]
+
 def process_rpy_file(args):
-    """处理单个 .rpy 文件并返回数据，用于导出。"""
-    rpy_file_path, language, shared_data = args
-    data = extract_translation_data(rpy_file_path, language)
-    shared_data.extend(data)
-
-def export_to_excel(tl_folder_path: str, language: str, output_excel_file: str):
-    """将翻译数据导出到 Excel 文件。"""
-    workbook = openpyxl.Workbook()
-    sheet = workbook.active
-    # 修改列名，并添加一列空的占位列，第一行改为“特殊”
-    sheet.append(["前缀", "原文", "译文", "特殊", "定位", "标识"])
-
-    rpy_files = [os.path.join(root, file) for root, _, files in os.walk(tl_folder_path) for file in files if file.endswith(".rpy")]
-    total_files = len(rpy_files)
-
-    with Manager() as manager:
-        shared_data = manager.list()
-        pool_size = min(multiprocessing.cpu_count(), total_files)
-
-        with multiprocessing.Pool(pool_size) as pool:
-            with tqdm(total=total_files, desc="处理文件") as pbar:
-                for _ in pool.imap_unordered(process_rpy_file, [(rpy_file, language, shared_data) for rpy_file in rpy_files]):
-                    pbar.update()
-
-        # 批量写入 Excel，将定位和标识写入到第五、六列
-        data_to_write = []
-        for item in shared_data:
-            # 对导出excel的行进行调整，当prefix为空时，不填入narrator
-            data_to_write.append([item["Prefix"], item["Original"], item["Translation"], "", item["Location"], item["Identifier"]])
-        for row in tqdm(data_to_write, desc="写入 Excel"):
-            sheet.append(row)
-
-        # 设置列宽
-        for col in range(1, sheet.max_column + 1):
-            sheet.column_dimensions[get_column_letter(col)].width = 25
-        workbook.save(output_excel_file)
+    """
+    处理单个 .rpy 文件，用于导出。
+    返回 (内容哈希, 行, 日志记录, 剖析统计)；内容哈希与缓存中记录的哈希一致时不再解析，行为 None。
+    日志在工作进程中缓冲，由主进程逐个文件输出；未启用剖析时剖析统计为 None。
+    """
+    rpy_file_path, language, cached_hash = args
+    log = LogBuffer()
+    profile = FileProfile(rpy_file_path)
+    with worker_task():
+        try:
+            with profile.phase("read"):
+                # 大文件映射到内存、逐行解码，不整体读入（见 rpy_tokenizer.MappedLines）
+                if os.path.getsize(rpy_file_path) >= MMAP_THRESHOLD_BYTES:
+                    mapped = MappedLines(rpy_file_path)
+                    raw, lines = mapped.data, mapped
+                else:
+                    mapped = None
+                    with open(rpy_file_path, 'rb') as f:
+                        raw = f.read()
+                    lines = decode_lines(raw)
+        except Exception as e:
+            log.error("文件: %s, 发生错误: %s - %s", rpy_file_path, type(e).__name__, e)
+            return None, [], log.records, profile.result()
+        try:
+            with profile.phase("hash"):
+                content_hash = hashlib.sha1(raw).hexdigest()
+            if content_hash == cached_hash:
+                log.debug("%s：内容与缓存一致，未重新解析。", rpy_file_path)
+                return content_hash, None, log.records, profile.result()
+            with profile.phase("parse"):
+                rows = to_rows(extract_translation_data(rpy_file_path, language, lines, log))
+        finally:
+            if mapped is not None:
+                mapped.close()
+        profile.count("rows", len(rows))
+        log.debug("%s：解析出 %d 行。", rpy_file_path, len(rows))
+        return content_hash, rows, log.records, profile.result()
+
+def _export_task(task):
+    """进程池任务：("export", process_rpy_file 的参数) 或 ("scan", 源脚本路径)（见 ConditionScan）。"""
+    kind, args = task
+    if kind == "scan":
+        dialogue, records, stats = scan_source_file(args)
+        return dialogue, None, records, stats
+    return process_rpy_file(args)
+
+def _init_worker(log_level, profile_options):
+    """进程池初始化函数：设置工作进程的日志级别和剖析选项。"""
+    init_worker_logging(log_level)
+    init_worker_profiling(profile_options)
+
+def cache_path_for(output_excel_file: str, language: str = None) -> str:
+    """
+    解析缓存保存在工作簿旁边，例如 chinese.xlsx 对应 chinese.xlsx.cache.json；
+    多种语言写入同一个工作簿时每种语言一个缓存，例如 all.xlsx.chinese.cache.json。
+    """
+    return output_excel_file + (f".{language}" if language else "") + ".cache.json"
+
+def load_parse_cache(cache_file: str, language: str) -> dict:
+    """读取解析缓存，返回 {相对路径: 条目}；缓存不存在、已损坏或版本不一致时返回空字典。"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning("解析缓存 %s 无法读取，将重新解析全部文件：%s - %s", cache_file, type(e).__name__, e)
+        return {}
+    if (cache.get("version") != CACHE_VERSION or cache.get("parser") != PARSER_VERSION
+            or cache.get("language") != language):
+        logger.info("解析缓存的版本或语言不一致，将重新解析全部文件。")
+        return {}
+    return cache.get("files", {})
+
+def save_parse_cache(cache_file: str, language: str, files: dict):
+    """先写入临时文件再替换，避免中断时留下损坏的缓存。"""
+    temp_file = cache_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({"version": CACHE_VERSION, "parser": PARSER_VERSION, "language": language, "files": files},
+                  f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temp_file, cache_file)
+
+class ReadyBuffer:
+    """
+    按 file_stats 中的位置暂存已完成、但排在前面的文件还没写入的结果 (内容哈希, 行)。
+    内存中的行数达到 max_rows 后，之后到达的结果用 pickle 追加到一个临时文件，取出时再读回，
+    因此无论文件按什么顺序完成，暂存占用的内存都有上限。
+    """
+
+    def __init__(self, max_rows=READY_ROWS):
+        self.max_rows = max_rows
+        self.rows = 0
+        self._items = {}  # 位置 -> (是否在临时文件中, 结果或其在临时文件中的偏移)
+        self._spool = None
+
+    def __contains__(self, position):
+        return position in self._items
+
+    def put(self, position, result):
+        count = len(result[1] or ())
+        if self.rows + count <= self.max_rows:
+            self._items[position] = (False, result)
+            self.rows += count
+            return
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile()
+        offset = self._spool.seek(0, os.SEEK_END)
+        pickle.dump(result, self._spool, protocol=pickle.HIGHEST_PROTOCOL)
+        self._items[position] = (True, offset)
+
+    def pop(self, position):
+        spooled, value = self._items.pop(position)
+        if not spooled:
+            self.rows -= len(value[1] or ())
+            return value
+        self._spool.seek(value)
+        return pickle.load(self._spool)
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+
+class DedupWriter:
+    """
+    去重导出：包装 TableWriter 或工作表写入对象，把前缀、原文和现有译文都相同的行合并为一行。
+    合并后的行位于第一次出现的位置，定位和标识取第一次出现的值，次数列为出现次数，
+    出现多次时出现位置列列出每一处的定位和标识，导入时同一译文会写入其中每一个标识。
+    现有译文不同的行不合并，导入时不会覆盖按上下文区分的译文。行在 close 时一次写入。
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.rows_written = 0
+        self._groups = {}  # (前缀, 原文, 译文) -> [第一行, [(定位, 标识), ...]]，按第一次出现的顺序
+
+    def append(self, row):
+        prefix, original, translation, _, location, identifier = row
+        group = self._groups.get((prefix, original, translation))
+        if group is None:
+            self._groups[(prefix, original, translation)] = [row, [(location, identifier)]]
+        else:
+            group[1].append((location, identifier))
+        self.rows_written += 1
+
+    def close(self):
+        for row, occurrences in self._groups.values():
+            self.writer.append(list(row) + [len(occurrences), format_occurrences(occurrences) if len(occurrences) > 1 else None])
+        logger.debug("去重：%d 行合并为 %d 行。", self.rows_written, len(self._groups))
+        self.writer.close()
+
+class ConditionScan:
+    """
+    导出时同时完成条件修补（export.py --mark）：source_files 为 game 下（不含 tl）的源脚本，
+    与翻译文件在同一个进程池中扫描，dialogue 由 export_languages 按 source_files 的顺序填入各文件条件块内的对话。
+    """
+
+    def __init__(self, source_files):
+        self.source_files = source_files
+        self.dialogue = [None] * len(source_files)
+
+class ConditionWriter:
+    """
+    包装写入对象，在写入之前填好“特殊”列：行在 close 时根据 ConditionScan 的扫描结果一次性标记后写入，
+    结果与先导出、再运行 mark.py 相同，但表格只保存一次。去重导出时位于 DedupWriter 之内，标记合并后的行。
+    """
+
+    def __init__(self, writer, scan):
+        self.writer = writer
+        self.scan = scan
+        self.rows_written = 0
+        self._rows = []
+
+    def append(self, row):
+        self._rows.append(normalize_row(row, len(row)))
+        self.rows_written += 1
+
+    def close(self):
+        rows_to_modify = conditions_for_rows([COLUMNS] + self._rows, self.scan.source_files, self.scan.dialogue)
+        for row_index, condition in rows_to_modify:
+            self._rows[row_index - 2][3] = condition
+        logger.info("标记了 %d 行的“特殊”列。", len({row_index for row_index, _ in rows_to_modify}))
+        for row in self._rows:
+            self.writer.append(row)
+        self.writer.close()
+
+def open_writer(output_file: str, dedupe: bool = False, shard_rows: int = None, workers: int = None,
+                scan: ConditionScan = None):
+    """按导出选项创建一种语言的写入对象：普通表格、分片表格，以及可选的条件修补和去重包装。"""
+    columns = DEDUP_COLUMNS if dedupe else COLUMNS
+    if shard_rows:
+        writer = ShardWriter(output_file, columns=columns, shard_rows=shard_rows, workers=workers)
+    else:
+        writer = TableWriter(output_file, columns=columns)
+    return wrap_writer(writer, dedupe, scan)
+
+def wrap_writer(writer, dedupe: bool = False, scan: ConditionScan = None):
+    """按需包上条件修补（ConditionWriter）和去重（DedupWriter），条件修补在内层，标记的是最终写入的行。"""
+    if scan is not None:
+        writer = ConditionWriter(writer, scan)
+    return DedupWriter(writer) if dedupe else writer
+
+# 一次导出中的一种语言：语言名、翻译文件夹、写入对象（TableWriter 或 WorkbookWriter 的工作表）、解析缓存文件（None 表示不使用缓存）
+ExportJob = namedtuple("ExportJob", "language folder writer cache_file")
+
+def export_languages(jobs: list, use_cache: bool = True, profiler: Profiler = None, workers: int = None,
+                     batch_bytes: int = None, serial_threshold: int = None, store: TranslationStore = None,
+                     scan: ConditionScan = None):
+    """
+    在一次运行中导出一种或多种语言（jobs 为 ExportJob 列表），所有语言的文件一起调度，只启动一个进程池。
+    需要解析的文件按大小从大到小交给工作进程（workers、batch_bytes、serial_threshold 见 tl_schedule），
+    主进程边接收边写入各语言的写入对象；先完成的靠后文件暂存到排在前面的文件写入为止（超过 READY_ROWS 行后
+    暂存到临时文件，见 ReadyBuffer），因此每种语言的行始终按文件路径、再按文件内位置排序，内存占用也有上限。写入对象在结束时关闭。
+    use_cache 为 True 时使用各语言的解析缓存，只重新解析新增或改动过的文件。
+    profiler 为 tl_profile.Profiler，启用时记录各阶段耗时和每个文件的统计。
+    store 为 tl_store.TranslationStore 时，同时把每个文件的行写入翻译库并在结束时提交。
+    scan 为 ConditionScan 时，其中的源脚本与翻译文件在同一个进程池中扫描，扫描结果在关闭写入对象之前全部收齐。
+    """
+    profiler = profiler or Profiler("export")
+
+    # 大小和修改时间都与缓存一致的文件直接复用缓存中的行；其余文件交给工作进程，
+    # 工作进程会先比较内容哈希，只有内容确实变化时才重新解析。
+    file_stats = []  # (语言下标, 相对路径, stat, 是否与缓存一致)，按语言、再按路径排列
+    tasks = []  # ("export", process_rpy_file 的参数)，之后是 ("scan", 源脚本)
+    task_positions = []  # 每个导出任务在 file_stats 中的位置
+    task_sizes = []
+    cached = []
+    new_caches = []
+    for job_index, job in enumerate(jobs):
+        with profiler.phase("walk"):
+            rpy_files = sorted(os.path.join(root, file) for root, _, files in os.walk(job.folder) for file in files if file.endswith(".rpy"))
+        with profiler.phase("cache_load"):
+            cached_files = load_parse_cache(job.cache_file, job.language) if use_cache and job.cache_file else {}
+        cached.append(cached_files)
+        new_caches.append({})
+        with profiler.phase("stat"):
+            for rpy_file in rpy_files:
+                key = os.path.relpath(rpy_file, job.folder).replace(os.sep, "/")
+                stat = os.stat(rpy_file)
+                entry = cached_files.get(key)
+                unchanged = entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                file_stats.append((job_index, key, stat, unchanged))
+                if not unchanged:
+                    tasks.append(("export", (rpy_file, job.language,
+                                             entry["sha1"] if entry is not None and entry["size"] == stat.st_size else None)))
+                    task_positions.append(len(file_stats) - 1)
+                    task_sizes.append(stat.st_size)
+
+    export_tasks = len(tasks)
+    if scan is not None:
+        for source_file in scan.source_files:
+            tasks.append(("scan", source_file))
+            task_sizes.append(os.path.getsize(source_file))
+
+    total_rows = [0] * len(jobs)
+    store_changes = [0] * len(jobs)
+    total_files = [0] * len(jobs)
+    parsed_files = [0] * len(jobs)
+    plan = plan_schedule(task_sizes, workers, batch_bytes, serial_threshold)
+    if tasks:
+        logger.info("%s。", describe_plan(plan))
+    results = profiler.iterate(run_scheduled(_export_task, tasks, plan, _init_worker,
+                                             (effective_level(), profiler.worker_options())), "ipc_wait")
+
+    ready = ReadyBuffer()  # 已完成但还不能写入的文件：file_stats 中的位置 -> (内容哈希, 行)
+
+    def receive(task_index, result):
+        # 翻译文件的结果为 (内容哈希, 行, ...)，源脚本扫描的结果为 (对话列表, None, ...)
+        value, task_rows, records, stats = result
+        replay(logger, records)
+        profiler.add_file(stats)
+        if task_index >= export_tasks:
+            scan.dialogue[task_index - export_tasks] = value
+        else:
+            ready.put(task_positions[task_index], (value, task_rows))
+
+    position = 0
+    try:
+        with tqdm(total=len(file_stats), desc="处理文件") as pbar:
+            while position < len(file_stats):
+                job_index, key, stat, unchanged = file_stats[position]
+                entry = cached[job_index].get(key)
+                if unchanged:
+                    rows = entry["rows"]
+                    content_hash = entry["sha1"]
+                elif position in ready:
+                    content_hash, rows = ready.pop(position)
+                    if rows is None:
+                        rows = entry["rows"]
+                    else:
+                        parsed_files[job_index] += 1
+                else:
+                    # 等待下一个完成的文件，它不一定是当前位置的文件
+                    receive(*next(results))
+                    continue
+                # 只有使用解析缓存时才保留各文件的行，否则写入后即可释放
+                if content_hash is not None and use_cache and jobs[job_index].cache_file:
+                    new_caches[job_index][key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": content_hash, "rows": rows}
+                writer = jobs[job_index].writer
+                with profiler.phase("write_rows"):
+                    for row in rows:
+                        writer.append(row)
+                if store is not None:
+                    with profiler.phase("store"):
+                        store_changes[job_index] += store.replace_file(jobs[job_index].language, key, rows)
+                total_rows[job_index] += len(rows)
+                total_files[job_index] += 1
+                position += 1
+                pbar.update()
+        # 收齐剩余的源脚本扫描结果
+        for task_index, result in results:
+            receive(task_index, result)
+        with profiler.phase("workbook_save"):
+            for job in jobs:
+                job.writer.close()
+    finally:
+        # 结束生成器，关闭进程池
+        results.close()
+        ready.close()
+
+    for job_index, job in enumerate(jobs):
+        if store is not None:
+            with profiler.phase("store"):
+                sources = [key for index, key, _, _ in file_stats if index == job_index]
+                store_changes[job_index] += store.remove_missing(job.language, sources)
+                store.commit()
+            logger.info("%s：翻译库 %s 中改动了 %d 行（版本 %d）。", job.language, store.path, store_changes[job_index], store.version)
+        if use_cache and job.cache_file:
+            with profiler.phase("cache_save"):
+                save_parse_cache(job.cache_file, job.language, new_caches[job_index])
+        if len(jobs) > 1:
+            logger.info("%s：写入 %d 行，重新解析 %d 个文件，%d 个文件使用缓存。", job.language, total_rows[job_index],
+                        parsed_files[job_index], total_files[job_index] - parsed_files[job_index])
+    profiler.count("rows", sum(total_rows))
+    profiler.count("parsed_files", sum(parsed_files))
+    logger.info("共写入 %d 行，重新解析 %d 个文件，%d 个文件使用缓存。", sum(total_rows), sum(parsed_files),
+                sum(total_files) - sum(parsed_files))
+
+def export_to_excel(tl_folder_path: str, language: str, output_excel_file: str, use_cache: bool = True,
+                    profiler: Profiler = None, workers: int = None, batch_bytes: int = None,
+                    serial_threshold: int = None, dedupe: bool = False, shard_rows: int = None):
+    """
+    将一种语言的翻译数据导出到 Excel 文件，参数含义见 export_languages。
+    输出格式由 output_excel_file 的扩展名决定（xlsx、csv、tsv、jsonl 或 parquet）；dedupe 为 True 时见 DedupWriter。
+    shard_rows 不为空时按约 shard_rows 行拆分为多个分片，在解析的同时由最多 tl_shards.WRITER_PROCESSES 个进程保存，
+    解析结束后由 workers 个进程保存其余分片（见 tl_shards.ShardWriter）。
+    """
+    writer = open_writer(output_excel_file, dedupe, shard_rows, workers)
+    job = ExportJob(language, tl_folder_path, writer, cache_path_for(output_excel_file))
+    export_languages([job], use_cache, profiler, workers, batch_bytes, serial_threshold)
 
 
 if __name__ == '__main__':
@@ -117,18 +420,75 @@ if __name__ == '__main__':
     game_root = "."
     tl_folder = os.path.join(game_root, "game", "tl")
 
-    language_folder = input("请输入要操作的语言文件夹名称 (例如: chinese): ")
-    language_path = os.path.join(tl_folder, language_folder)
-    if not os.path.isdir(language_path):
-        print("指定的语言文件夹不存在！")
+    parser = argparse.ArgumentParser(description="将 game/tl/<语言> 下的翻译文本导出到 Excel。")
+    parser.add_argument("language", nargs="*", help="语言文件夹名称（例如：chinese），可以给出多个；省略时交互输入")
+    parser.add_argument("--all", action="store_true", help="导出 game/tl 下的全部语言文件夹")
+    parser.add_argument("--combined", metavar="FILE.xlsx", default=None,
+                        help="把所有语言写入同一个 xlsx 文件，每种语言一个工作表（默认每种语言一个文件）")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="相同的前缀、原文和译文只导出一行，附带出现次数和隐藏的出现位置列；导入时译文写入每一处")
+    parser.add_argument("--shard-rows", type=int, default=None, metavar="N",
+                        help="把每种语言拆分为约 N 行一个的分片表格（在源文件边界处切分），在解析的同时由后台进程保存、解析结束后由全部进程保存，"
+                             "并写出索引文件 <语言>.shards.json")
+    parser.add_argument("--mark", action="store_true",
+                        help="导出的同时完成 mark.py 的条件修补：源脚本与翻译文件在同一个进程池中扫描，表格只保存一次")
+    parser.add_argument("--store", metavar="FILE.sqlite", default=None,
+                        help="同时把导出的行写入该 SQLite 翻译库（见 tl_store.py），供 import.py --store 使用")
+    parser.add_argument("--no-cache", action="store_true", help="不使用解析缓存，重新解析全部文件")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), default="xlsx",
+                        help="输出格式，默认 xlsx；csv/tsv/jsonl/parquet 读写更快，适合自动化流程")
+    add_schedule_arguments(parser)
+    add_logging_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+    setup_logging(args.verbose, args.log_file)
+
+    if args.all:
+        languages = list_languages(tl_folder)
+    else:
+        languages = args.language or input("请输入要操作的语言文件夹名称，多个用空格分隔 (例如: chinese): ").split()
+    missing = [language for language in languages if not os.path.isdir(os.path.join(tl_folder, language))]
+    if not languages or missing:
+        logger.error("指定的语言文件夹不存在！%s", " ".join(missing))
+        exit()
+
+    if args.combined and args.shard_rows:
+        logger.error("--combined 与 --shard-rows 不能同时使用。")
         exit()
 
-    excel_file = os.path.join(game_root, f"{language_folder}.xlsx")
+    workbook = WorkbookWriter(args.combined) if args.combined else None
+    scan = ConditionScan(list_source_files(game_root)) if args.mark else None
+    jobs = []
+    outputs = []
+    for language_folder in languages:
+        language_path = os.path.join(tl_folder, language_folder)
+        if workbook is not None:
+            writer = workbook.sheet(language_folder, DEDUP_COLUMNS if args.dedupe else COLUMNS)
+            jobs.append(ExportJob(language_folder, language_path, wrap_writer(writer, args.dedupe, scan),
+                                  cache_path_for(args.combined, language_folder)))
+            continue
+        excel_file = os.path.join(game_root, f"{language_folder}.{args.format}")
+        output = shard_index_path(excel_file) if args.shard_rows else excel_file
+        if os.path.exists(output):
+            logger.info("文件 %s 已存在，将会被覆盖。", output)
+        outputs.append(output)
+        jobs.append(ExportJob(language_folder, language_path,
+                              open_writer(excel_file, args.dedupe, args.shard_rows, args.workers, scan), cache_path_for(excel_file)))
 
-    if os.path.exists(excel_file):
-        print(f"文件 {excel_file} 已存在，将会被覆盖。")
-    export_to_excel(language_path, language_folder, excel_file)
-    print(f"翻译数据已导出到 {excel_file}")
+    profiler = profiler_from_args("export", args)
+    profiler.start()
+    store = TranslationStore(args.store) if args.store else None
+    export_languages(jobs, use_cache=not args.no_cache, profiler=profiler, store=store, scan=scan, **schedule_options(args))
+    if store is not None:
+        store.close()
+    if workbook is not None:
+        with profiler.phase("workbook_save"):
+            workbook.close()
+    profiler.finish(logger)
+    if workbook is not None:
+        logger.info("翻译数据已导出到 %s（%d 个工作表）", args.combined, len(jobs))
+    else:
+        logger.info("翻译数据已导出到 %s", "、".join(outputs))
 
     end_time = time.time()
-    print(f"总耗时：{end_time - start_time} 秒")
\ No newline at end of file
+    logger.info("总耗时：%.3f 秒", end_time - start_time)
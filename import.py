@@ -1,10 +1,35 @@
 import os
-import re
-import concurrent.futures
+import json
+import shutil
+import tempfile
 import datetime
 import traceback
+import pickle
+import time
+import argparse
+import logging
+import itertools
 import multiprocessing
-import pandas as pd
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from tl_formats import iter_rows, FORMATS, DEDUP_COLUMNS, parse_occurrences
+from tl_log import get_logger, setup_logging, add_logging_arguments, effective_level, init_worker_logging, LogBuffer, replay
+from tl_profile import Profiler, FileProfile, init_worker_profiling, worker_task, add_profiling_arguments, profiler_from_args
+from tl_shards import is_shard_index, read_shard_index, shard_index_path, map_tables
+from tl_store import TranslationStore
+from tl_schedule import plan_schedule, describe_plan, run_scheduled, add_schedule_arguments, schedule_options
+from tl_paths import list_languages
+from rpy_tokenizer import decode_lines, encode_lines, tokenize, DialogueLine, StringPair
+
+# 工作进程内的翻译索引（语言 -> (dialogue_index, strings_index)），由 _init_worker 在每个进程启动时设置一次，
+# 避免每提交一个文件就把整张翻译表重新序列化发送一遍。
+_worker_indexes = None
+_worker_setup_seconds = None
+
+# 流水线模式（--io-threads）中每个阶段最多同时持有的文件数为该值乘以线程数或进程数中较大的一个
+PIPELINE_DEPTH = 2
+
+logger = get_logger("import")
 
 def timestamp():
     # 返回当前时间戳字符串
@@ -18,200 +43,684 @@ def normalize_lang(lang):
     """
     return lang[1:] if lang.startswith("c") else lang
 
-def process_file(filepath, language, all_translations):
-    """处理单个 .rpy 文件，应用翻译。"""
-    print(f"[{timestamp()}] 正在处理文件：{filepath}")
+def translation_record(row):
+    """把表格中的一行（六列，或去重表格的八列）转换为翻译记录；原文、译文或定位为空时返回 None。"""
+    prefix, original_text, translated_text, _, location, identifier, _, occurrences = (
+        value if value is not None else "" for value in list(row) + [None] * (8 - len(row))
+    )
+    if not original_text or not translated_text or not location:
+        return None
+    return {
+        'prefix': prefix,
+        'original_text': original_text,
+        'translated_text': translated_text,
+        'location': location,
+        'identifier': identifier,
+        'identifiers': [identifier] + [other for _, other in parse_occurrences(occurrences) if other and other != identifier],
+    }
+
+def iter_store_translations(store, language, sources=None):
+    """
+    从 SQLite 翻译库（tl_store）查询翻译记录。sources 不为空时只查询这些翻译文件中的对话行，
+    strings 行总是全部查询，使同一原文"首个匹配生效"的结果与读取整张表格时相同。
+    """
+    if sources is None:
+        rows = store.iter_rows(language)
+    else:
+        rows = itertools.chain((row for row in store.iter_rows(language, sources) if row[5]), store.iter_strings(language))
+    for row in rows:
+        translation = translation_record(row)
+        if translation is not None:
+            yield translation
+
+def iter_excel_translations(excel_file, sheet=None, log=None):
+    """
+    逐行流式读取翻译表格（xlsx 默认为第一个工作表，sheet 不为空时为该名称的工作表；也支持 csv/tsv/jsonl/parquet），
+    生成翻译记录。原文、译文或定位为空的行会被跳过。log 默认使用模块的 logger。
+    去重导出的表格（export.py --dedupe）中一行可能对应多处出现，identifiers 为该行的全部标识，
+    普通表格中只有标识列的一个值。
+    """
+    log = log or logger
+    log.info("加载 Excel 文件：%s%s", excel_file, f"（工作表 {sheet}）" if sheet else "")
+    skipped = 0
+    for row_number, row in enumerate(iter_rows(excel_file, sheet=sheet, columns=DEDUP_COLUMNS), start=2): # 第一行为表头
+        translation = translation_record(row)
+        if translation is None:
+            log.debug("跳过第 %d 行：原文、译文或定位为空。", row_number)
+            skipped += 1
+            continue
+        yield translation
+    if skipped:
+        log.info("跳过了 %d 个原文、译文或定位为空的行（使用 --verbose 查看行号）。", skipped)
+
+def _read_shard_task(shard_file):
+    """在工作进程中读取一个分片的全部翻译记录，返回 (翻译记录列表, 日志记录)。"""
+    log = LogBuffer()
+    return list(iter_excel_translations(shard_file, log=log)), log.records
 
+def read_translations(excel_file, sheet=None, workers=None, serial_threshold=None):
+    """
+    返回表格中的翻译记录。excel_file 为分片索引（export.py --shard-rows 的输出）时，
+    由多个进程同时读取各分片，再按分片顺序依次返回，"首个匹配生效"的规则与单个表格相同。
+    """
+    if not is_shard_index(excel_file):
+        yield from iter_excel_translations(excel_file, sheet)
+        return
+    shard_files = read_shard_index(excel_file)
+    logger.info("读取分片索引 %s：%d 个分片。", excel_file, len(shard_files))
+    results = map_tables(_read_shard_task, shard_files, shard_files, workers, serial_threshold,
+                         init_worker_logging, (effective_level(),))
+    for translations, records in results:
+        replay(logger, records)
+        yield from translations
+
+def build_translation_index(all_translations, language):
+    """
+    将 Excel 中的翻译记录预先构建为哈希索引：
+    dialogue_index 以 (归一化语言, 标识符) 为键，用于 translate 块中的对话行；
+    strings_index 以原文为键，用于 strings 块中的 old/new 结构。
+    同一个键出现多次时只保留第一条记录，与原先逐条遍历时"首个匹配生效"的规则一致。
+    去重表格中的一行以其全部标识分别加入 dialogue_index，同一译文写入每一处出现。
+    """
+    lang_key = normalize_lang(language)
+    dialogue_index = {}
+    strings_index = {}
+    for translation in all_translations:
+        if translation['identifier']:
+            for identifier in translation['identifiers']:
+                dialogue_index.setdefault((lang_key, identifier), translation['translated_text'])
+        else:
+            strings_index.setdefault(translation['original_text'], translation['translated_text'])
+    return dialogue_index, strings_index
+
+def atomic_write_bytes(filepath, data):
+    """先写入同目录下的临时文件再原子替换，中断时原文件保持完整。"""
+    directory, name = os.path.split(filepath)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
     try:
-        with open(filepath, 'r', encoding='utf-8-sig') as f:
-            lines = f.readlines()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(filepath, temp_path)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def process_file(filepath, dialogue_index, strings_index, log=None, profile=None, parsed=None):
+    """
+    处理单个 .rpy 文件，应用翻译。
+    只有内容与原文件逐字节不同时才写回（原子替换），返回是否写入了文件。
+    log 为日志输出对象，工作进程中传入 LogBuffer，默认直接使用模块的 logger；
+    profile 为 FileProfile，记录读取、解析、匹配、写入各阶段的耗时。
+    parsed 为已经读入并解析的 (原始字节, 各行, 分词记录) 时不再读取文件（监视模式），各行不会被修改。
+    """
+    log = log or logger
+    profile = profile or FileProfile(filepath)
+    log.debug("正在处理文件：%s", filepath)
+
+    try:
+        if parsed is not None:
+            raw, lines, records = parsed
+            lines = list(lines)
+        else:
+            with profile.phase("read"):
+                with open(filepath, 'rb') as f:
+                    raw = f.read()
+            with profile.phase("parse"):
+                lines = decode_lines(raw)
+                records = list(tokenize(lines))
     except FileNotFoundError:
-        print(f"[{timestamp()}] 错误：未找到文件 '{filepath}'。跳过该文件。")
-        return
+        log.error("未找到文件 '%s'。跳过该文件。", filepath)
+        return False
     except Exception as e:
-        print(f"[{timestamp()}] 读取文件 '{filepath}' 时出错：{type(e).__name__}: {e}\n{traceback.format_exc()}")
-        return
-
-    file_modified = False
-    current_block = None  # 当前翻译块信息（包含语言和标识符）
-    new_lines = []
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        # 检查翻译块头，例如 "translate chinese startday4_881cedf5:"
-        translate_match = re.match(r'^\s*translate\s+(\w+)\s+(\w+):\s*$', line)
-        if translate_match:
-            current_block = {
-                'language': translate_match.group(1),
-                'identifier': translate_match.group(2)
-            }
-            new_lines.append(line)
-            i += 1
-            continue
+        log.error("读取文件 '%s' 时出错：%s: %s\n%s", filepath, type(e).__name__, e, traceback.format_exc())
+        return False
 
-        # 如果处于翻译块内且当前行不是注释，则尝试匹配对话行
-        if current_block is not None and not line.lstrip().startswith("#"):
-            # 根据行首是否以双引号开头判断是否有 actor
-            if line.lstrip().startswith('"'):
-                # 无 actor 的情况
-                dialogue_match = re.match(r'^(\s*)"(.*)"\s*$', line)
-                if dialogue_match:
-                    indent = dialogue_match.group(1)
-                    actor = ""
-                    dialogue_text = dialogue_match.group(2)
-                else:
-                    dialogue_text = None
-            else:
-                # 有 actor 的情况
-                dialogue_match = re.match(r'^(\s*)(\S+)\s*"(.*)"\s*$', line)
-                if dialogue_match:
-                    indent = dialogue_match.group(1)
-                    actor = dialogue_match.group(2)
-                    dialogue_text = dialogue_match.group(3)
-                else:
-                    dialogue_text = None
+    replaced, new_raw = patch_file(filepath, raw, lines, records, dialogue_index, strings_index, log, profile)
+    if new_raw is None:
+        return False
+    try:
+        with profile.phase("write"):
+            atomic_write_bytes(filepath, new_raw)
+        log.info("%s：替换 %d 行，文件已更新。", filepath, replaced)
+        return True
+    except Exception as e:
+        log.error("写入文件 '%s' 时出错：%s: %s\n%s", filepath, type(e).__name__, e, traceback.format_exc())
+        return False
 
-            if dialogue_text is not None:
+def patch_file(filepath, raw, lines, records, dialogue_index, strings_index, log, profile):
+    """
+    在 lines（会被修改）上应用翻译，返回 (替换的行数, 新内容)；没有需要替换的行或替换后内容不变时新内容为 None。
+    raw 为原文件的字节内容，用于保留 BOM 和换行风格。不读写文件，process_file 与流水线模式共用。
+    """
+    replaced = 0
+    with profile.phase("match"):
+        for record in records:
+            if isinstance(record, DialogueLine) and record.target is not None:
+                dialogue_text = record.translation
                 # 如果文本中包含字面 "\n"，则认为 "\n" 后面的部分为当前翻译；否则整个文本为当前翻译
                 if "\\n" in dialogue_text:
                     current_candidate = dialogue_text.split("\\n", 1)[1]
                 else:
                     current_candidate = dialogue_text
 
-                found_translation = None
-                # 遍历 Excel 中加载的翻译记录，寻找与当前翻译块匹配的记录
-                for translation in all_translations:
-                    if (translation['identifier'] and
-                        normalize_lang(current_block['language']) == normalize_lang(language) and
-                        current_block['identifier'] == translation['identifier']):
-                        found_translation = translation['translated_text']
-                        break
+                # 通过 (归一化语言, 标识符) 索引查找与当前翻译块匹配的记录
+                block = record.block
+                found_translation = dialogue_index.get((normalize_lang(block.language), block.identifier))
 
                 # 如果找到匹配的翻译且当前文件中的翻译与 Excel 中的不一致，则更新
                 if found_translation is not None and found_translation != current_candidate:
-                    if actor:
-                        new_line = f'{indent}{actor}"{found_translation}"\n'
-                        print(f"[{timestamp()}] 使用标识符 '{current_block['identifier']}' 替换文件 {filepath} 中 actor '{actor}' 的对话。")
+                    lines[record.target] = f'{record.head}"{found_translation}"{record.tail}'
+                    if record.who:
+                        log.debug("使用标识符 '%s' 替换文件 %s 中 actor '%s' 的对话。", block.identifier, filepath, record.who)
                     else:
-                        new_line = f'{indent}"{found_translation}"\n'
-                        print(f"[{timestamp()}] 使用标识符 '{current_block['identifier']}' 替换文件 {filepath} 中无 actor 的对话。")
-                    new_lines.append(new_line)
-                    file_modified = True
-                    # 替换后退出当前翻译块
-                    current_block = None
-                    i += 1
-                    continue
-                else:
-                    # 若匹配成功且内容相同，则不修改，退出当前翻译块
-                    new_lines.append(line)
-                    current_block = None
-                    i += 1
-                    continue
+                        log.debug("使用标识符 '%s' 替换文件 %s 中无 actor 的对话。", block.identifier, filepath)
+                    replaced += 1
 
-        # 处理 old/new 结构
-        old_match = re.match(r'^(\s*)old\s*"(.*?)"\s*(#.*)?$', line)
-        if old_match:
-            original_text_in_file = old_match.group(2)
-            print(f"[{timestamp()}] 在文件 {filepath} 中找到 'old' 行：原文为 '{original_text_in_file}'")
-            new_lines.append(line)
-            if i + 1 < len(lines):
-                new_line_candidate = lines[i+1]
-                new_match = re.match(r'^(\s*)new\s*"(.*?)"(.*)$', new_line_candidate)
-                if new_match:
-                    replaced = False
-                    for translation in all_translations:
-                        if (not translation['identifier'] and 
-                            translation['original_text'] == original_text_in_file):
-                            indent_new = new_match.group(1)
-                            new_translation_text = translation['translated_text']
-                            new_line_replaced = f'{indent_new}new "{new_translation_text}"\n'
-                            print(f"[{timestamp()}] 用 '{new_translation_text}' 替换文件 {filepath} 中的 'new' 行。")
-                            new_lines.append(new_line_replaced)
-                            file_modified = True
-                            replaced = True
-                            break
-                    if replaced:
-                        i += 2
-                        continue
-                    else:
-                        new_lines.append(new_line_candidate)
-                        i += 2
-                        continue
-            i += 1
-            continue
+            elif isinstance(record, StringPair):
+                # 处理 old/new 结构
+                log.debug("在文件 %s 中找到 'old' 行：原文为 '%s'", filepath, record.original)
+                new_translation_text = strings_index.get(record.original)
+                # 只有译文确实不同时才改写该行，未变化的行不计入替换数
+                if new_translation_text is not None and new_translation_text != record.translation:
+                    lines[record.target] = f'{record.head}"{new_translation_text}"{record.tail}'
+                    log.debug("用 '%s' 替换文件 %s 中的 'new' 行。", new_translation_text, filepath)
+                    replaced += 1
+
+    profile.count("records", len(records))
+    profile.count("replaced", replaced)
 
-        # 其他行直接保留
-        new_lines.append(line)
-        i += 1
+    if not replaced:
+        log.info("%s：没有需要替换的行。", filepath)
+        return replaced, None
+    with profile.phase("write"):
+        new_raw = encode_lines(lines, raw)
+    if new_raw == raw:
+        # 替换后的内容与原文件相同，不写回，避免 Ren'Py 重新编译该文件
+        log.info("%s：替换 %d 行，内容未变，未写入。", filepath, replaced)
+        return replaced, None
+    return replaced, new_raw
 
-    if file_modified:
+def _init_worker(payload, log_level, profile_options):
+    """进程池初始化函数：每个工作进程只反序列化一次全部语言的翻译索引，并设置日志缓冲的级别和剖析选项。"""
+    global _worker_indexes, _worker_setup_seconds
+    start = time.perf_counter()
+    init_worker_logging(log_level)
+    init_worker_profiling(profile_options)
+    _worker_indexes = pickle.loads(payload)
+    _worker_setup_seconds = time.perf_counter() - start
+
+def _process_file_task(task):
+    """
+    在工作进程中处理单个文件，task 为 (语言, 文件路径)，使用进程内该语言的翻译索引。
+    返回 (处理耗时, 初始化耗时, 错误信息, 是否写入了文件, 日志记录, 剖析统计)，初始化耗时只在每个进程的第一个任务中上报一次。
+    日志记录在工作进程中缓冲，由主进程逐个文件输出；未启用剖析时剖析统计为 None。
+    """
+    global _worker_setup_seconds
+    language, filepath = task
+    setup_seconds, _worker_setup_seconds = _worker_setup_seconds or 0.0, None
+    start = time.perf_counter()
+    log = LogBuffer()
+    profile = FileProfile(filepath)
+    error = None
+    written = False
+    try:
+        with worker_task():
+            dialogue_index, strings_index = _worker_indexes[language]
+            written = process_file(filepath, dialogue_index, strings_index, log, profile)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+    return time.perf_counter() - start, setup_seconds, error, written, log.records, profile.result()
+
+def _read_file_task(task):
+    """流水线的读取阶段（I/O 线程）：task 为 (语言, 文件路径)，返回 (字节内容, 错误信息)。"""
+    try:
+        with open(task[1], 'rb') as f:
+            return f.read(), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def _patch_file_task(args):
+    """
+    流水线的计算阶段（工作进程）：args 为 (task, 读取阶段的结果)，在内存中解析并应用翻译，不写文件。
+    返回 (处理耗时, 初始化耗时, 错误信息, 替换的行数, 新内容, 日志记录, 剖析统计, 收到的文件内容字节数)，
+    新内容为 None 时不需要写回；读取失败时错误信息为读取阶段的错误。
+    """
+    global _worker_setup_seconds
+    (language, filepath), (raw, read_error) = args
+    setup_seconds, _worker_setup_seconds = _worker_setup_seconds or 0.0, None
+    start = time.perf_counter()
+    log = LogBuffer()
+    profile = FileProfile(filepath)
+    error = None
+    replaced, new_raw = 0, None
+    if read_error:
+        error = f"读取失败：{read_error}"
+    else:
         try:
-            with open(filepath, 'w', encoding='utf-8-sig') as f:
-                f.writelines(new_lines)
-            print(f"[{timestamp()}] 文件已更新：{filepath}")
+            with worker_task():
+                dialogue_index, strings_index = _worker_indexes[language]
+                log.debug("正在处理文件：%s", filepath)
+                with profile.phase("parse"):
+                    lines = decode_lines(raw)
+                    records = list(tokenize(lines))
+                replaced, new_raw = patch_file(filepath, raw, lines, records, dialogue_index, strings_index, log, profile)
         except Exception as e:
-            print(f"[{timestamp()}] 写入文件 '{filepath}' 时出错：{type(e).__name__}: {e}\n{traceback.format_exc()}")
+            error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+    return (time.perf_counter() - start, setup_seconds, error, replaced, new_raw, log.records, profile.result(),
+            len(raw) if raw is not None else 0)
 
-def update_rpy_translations(language):
-    """主函数：更新指定语言的翻译。"""
-    print(f"[{timestamp()}] 开始更新语言 {language} 的翻译。")
+def _write_file_task(task, result):
+    """流水线的写入阶段（I/O 线程）：有新内容时原子写回，返回 (是否写入了文件, 错误信息)。"""
+    new_raw = result[4]
+    if new_raw is None:
+        return False, None
+    try:
+        atomic_write_bytes(task[1], new_raw)
+        return True, None
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
 
-    excel_file = os.path.join(os.getcwd(), f"{language}.xlsx")
+def run_pipeline(tasks, read, compute, write, processes, io_threads, initializer=None, initargs=()):
+    """
+    读取、计算、写入三段重叠的流水线，适合网络存储等 I/O 延迟高的情况：
+    io_threads 个线程按 tasks 的顺序预读（read(task)），processes 个工作进程计算（compute((task, 读取结果))，
+    processes 为 0 时在当前线程中计算），另外 io_threads 个线程写回（write(task, 计算结果)）。
+    每个阶段同时持有的文件数都不超过 PIPELINE_DEPTH × max(processes, io_threads)，内存占用有上限。
+    按写入完成的顺序生成 (任务下标, 计算结果, 写入结果)；三个函数都应自行捕获并返回错误。
+    """
+    depth = PIPELINE_DEPTH * max(processes, io_threads, 1)
+    loaded, computed = deque(), deque()  # 已读入等待计算的 (下标, 读取结果)，已计算等待写入的 (下标, 计算结果)
+    reads, computing, writes = {}, {}, {}  # 各阶段进行中的 future
+    next_task = 0
+    # 工作进程在第一次提交任务时才启动，此时读写线程已经在运行；以 spawn 方式启动，避免从有活动线程的进程 fork
+    workers = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"), initializer=initializer,
+                                  initargs=initargs) if processes else None
+    if workers is None and initializer is not None and tasks:
+        initializer(*initargs)
+    try:
+        with ThreadPoolExecutor(io_threads) as readers, ThreadPoolExecutor(io_threads) as writers:
+            while next_task < len(tasks) or loaded or computed or reads or computing or writes:
+                while next_task < len(tasks) and len(reads) + len(loaded) < depth:
+                    reads[readers.submit(read, tasks[next_task])] = next_task
+                    next_task += 1
+                computed_here = False
+                while loaded and len(computing) + len(computed) < depth:
+                    index, content = loaded.popleft()
+                    if workers is None:
+                        # 在当前线程中计算时每次只算一个，之间继续提交读取和写入
+                        computed.append((index, compute((tasks[index], content))))
+                        computed_here = True
+                        break
+                    computing[workers.submit(compute, (tasks[index], content))] = index
+                while computed and len(writes) < depth:
+                    index, result = computed.popleft()
+                    writes[writers.submit(write, tasks[index], result)] = (index, result)
+
+                done, _ = wait(list(reads) + list(computing) + list(writes), timeout=0 if computed_here else None,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in reads:
+                        loaded.append((reads.pop(future), future.result()))
+                    elif future in computing:
+                        computed.append((computing.pop(future), future.result()))
+                    else:
+                        index, result = writes.pop(future)
+                        yield index, result, future.result()
+    finally:
+        if workers is not None:
+            workers.shutdown(cancel_futures=True)
+
+def write_manifest(manifest_file, language, touched_files):
+    """记录本次导入实际写入的文件，供构建脚本只处理这些文件。"""
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "language": language,
+            "finished_at": timestamp(),
+            "files": touched_files,
+        }, f, ensure_ascii=False, indent=2)
+
+def finish_store_import(store, languages, version):
+    """在翻译库中记录这些语言已导入到 version，下次 --changed-only 只处理之后的改动。"""
+    for language in languages:
+        store.mark_imported(language, version)
+    store.commit()
+    store.close()
+
+# 监视模式中一个 .rpy 文件的状态：stat 为 (修改时间, 大小)，raw/lines/records 为解析结果，
+# identifiers 与 originals 为文件中的对话标识和 strings 原文，用于判断表格的改动会影响哪些文件
+WatchedFile = namedtuple("WatchedFile", "stat raw lines records identifiers originals")
+
+def scan_rpy_files(folder):
+    """用 os.scandir 递归列出 folder 下的 .rpy 文件，返回 {路径: (修改时间, 大小)}。"""
+    found = {}
+    pending = [folder]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name.endswith(".rpy") and entry.is_file():
+                    stat = entry.stat()
+                    found[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+def load_watched_file(filepath):
+    """读取并解析一个 .rpy 文件，返回 WatchedFile。"""
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+        stat = os.fstat(f.fileno())
+    lines = decode_lines(raw)
+    records = list(tokenize(lines))
+    identifiers = {record.block.identifier for record in records if isinstance(record, DialogueLine)}
+    originals = {record.original for record in records if isinstance(record, StringPair)}
+    return WatchedFile((stat.st_mtime_ns, stat.st_size), raw, lines, records, identifiers, originals)
+
+def read_table_index(excel_file, language):
+    """读取翻译表格并构建索引，返回 (dialogue_index, strings_index)。"""
+    return build_translation_index(iter_excel_translations(excel_file), language)
+
+def watch_language(language, excel_file, interval=1.0, store_file=None):
+    """
+    监视模式：常驻内存，保留全部 .rpy 文件的解析结果和翻译索引，每隔 interval 秒用 os.scandir 和修改时间轮询。
+    翻译表格变化时重新读取表格，只把译文有变化的行写入包含这些标识或原文的文件；
+    game/tl/<语言> 下的 .rpy 文件被外部修改时只重新解析该文件并重新应用翻译；
+    store_file 不为空时还会重新导出该文件，把导出的行写入 SQLite 翻译库（没有翻译库时不导出）。按 Ctrl+C 结束。
+    """
     rpy_dir = os.path.join(os.getcwd(), "game", "tl", language)
+    store = TranslationStore(store_file) if store_file else None
+    files = {}
 
-    if not os.path.isdir(rpy_dir):
-        print(f"[{timestamp()}] 错误：目录 '{rpy_dir}' 不存在。")
-        return
+    def apply(filepath, dialogue_index, strings_index):
+        # 写入后重新解析，记下新的修改时间，自己写入的改动不会被当作外部修改
+        if process_file(filepath, dialogue_index, strings_index, parsed=files[filepath][1:4]):
+            files[filepath] = load_watched_file(filepath)
+            return True
+        return False
+
+    def table_stat():
+        try:
+            stat = os.stat(excel_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    start = time.perf_counter()
+    for filepath in sorted(scan_rpy_files(rpy_dir)):
+        files[filepath] = load_watched_file(filepath)
+    current_table = table_stat()
+    dialogue_index, strings_index = read_table_index(excel_file, language)
+    written = sum(apply(filepath, dialogue_index, strings_index) for filepath in sorted(files))
+    logger.info("监视模式：已解析 %d 个文件，索引了 %d 条对话翻译、%d 条字符串翻译，写入 %d 个文件（%.3f 秒）。每 %.1f 秒检查一次，按 Ctrl+C 结束。",
+                len(files), len(dialogue_index), len(strings_index), written, time.perf_counter() - start, interval)
 
-    all_translations = []
     try:
-        df = pd.read_excel(excel_file, engine='openpyxl')
-        print(f"[{timestamp()}] 加载 Excel 文件：{excel_file}")
-
-        for index, row in df.iterrows():
-            prefix = row[0] if not pd.isna(row[0]) else ""
-            original_text = row[1] if not pd.isna(row[1]) else ""
-            translated_text = row[2] if not pd.isna(row[2]) else ""
-            location = row[4] if not pd.isna(row[4]) else ""
-            identifier = row[5] if not pd.isna(row[5]) else ""
-
-            if not original_text or not translated_text or not location:
-                print(f"[{timestamp()}] 警告：跳过第 {index + 2} 行。")
+        while True:
+            time.sleep(interval)
+
+            # .rpy 文件的外部修改：只重新解析、导出和应用该文件
+            found = scan_rpy_files(rpy_dir)
+            for filepath in sorted(set(files) - set(found)):
+                del files[filepath]
+                logger.info("%s 已删除。", filepath)
+            for filepath, stat in sorted(found.items()):
+                if filepath in files and files[filepath].stat == stat:
+                    continue
+                start = time.perf_counter()
+                try:
+                    files[filepath] = load_watched_file(filepath)
+                except (FileNotFoundError, UnicodeDecodeError) as e:
+                    logger.warning("暂时无法读取 %s（%s），稍后重试。", filepath, type(e).__name__)
+                    continue
+                if store is not None:
+                    from export import extract_translation_data, to_rows
+                    rows = to_rows(extract_translation_data(filepath, language, files[filepath].lines))
+                    store.replace_file(language, os.path.relpath(filepath, rpy_dir).replace(os.sep, "/"), rows)
+                    store.commit()
+                    logger.info("%s 已变化：重新导出 %d 行到翻译库。", filepath, len(rows))
+                apply(filepath, dialogue_index, strings_index)
+                logger.info("%s 已变化：重新解析并应用翻译（%.3f 秒）。", filepath, time.perf_counter() - start)
+
+            # 翻译表格的修改：只应用译文有变化的行
+            stat = table_stat()
+            if stat is None or stat == current_table:
+                continue
+            start = time.perf_counter()
+            try:
+                new_dialogue, new_strings = read_table_index(excel_file, language)
+            except Exception as e:
+                # 表格可能正在保存，下次轮询时重试
+                logger.warning("暂时无法读取 %s（%s: %s），稍后重试。", excel_file, type(e).__name__, e)
                 continue
+            current_table = stat
+            changed_identifiers = {key[1] for key, text in new_dialogue.items() if dialogue_index.get(key) != text}
+            changed_originals = {original for original, text in new_strings.items() if strings_index.get(original) != text}
+            dialogue_index, strings_index = new_dialogue, new_strings
+            affected = [filepath for filepath, watched in sorted(files.items())
+                        if watched.identifiers & changed_identifiers or watched.originals & changed_originals]
+            written = sum(apply(filepath, dialogue_index, strings_index) for filepath in affected)
+            logger.info("%s 已变化：%d 条译文有改动，涉及 %d 个文件，写入 %d 个文件（%.3f 秒）。",
+                        excel_file, len(changed_identifiers) + len(changed_originals), len(affected), written,
+                        time.perf_counter() - start)
+    except KeyboardInterrupt:
+        logger.info("监视模式已结束。")
+    finally:
+        if store is not None:
+            store.close()
 
-            all_translations.append({
-                'prefix': prefix,
-                'original_text': original_text,
-                'translated_text': translated_text,
-                'location': location,
-                'identifier': identifier,
-            })
+def update_languages(languages, max_workers=None, batch_bytes=None, file_format="xlsx", profiler=None,
+                     serial_threshold=None, combined_file=None, sharded=False, store_file=None, changed_only=False,
+                     io_threads=None):
+    """
+    主函数：在一次运行中更新一种或多种语言的翻译，所有语言的文件一起调度，只启动一个进程池。
+    每种语言的翻译表格为当前目录下的 <语言>.<file_format>（xlsx、csv、tsv、jsonl 或 parquet）；
+    combined_file 不为空时改为读取该 xlsx 文件中与语言同名的工作表（export.py --combined 的输出）；
+    sharded 为 True 时读取分片索引 <语言>.shards.json 列出的各分片（export.py --shard-rows 的输出），各分片并行读取。
+    store_file 不为空时改为查询该 SQLite 翻译库（tl_store）；changed_only 为 True 时只处理上次导入之后
+    翻译库中有改动的行所在的文件，全部语言无错误完成后记录本次导入的版本号。
+    翻译表格或目录有问题的语言会被跳过，不影响其他语言。
+    文件按大小从大到小调度：max_workers 为进程数，默认等于 CPU 核心数（处理过程是 CPU 密集型）；
+    batch_bytes 为小文件合并成批时每批的目标大小，默认自动计算；
+    全部文件小于 serial_threshold 字节时在当前进程中处理（见 tl_schedule）。
+    io_threads 不为空时使用读取、计算、写入重叠的流水线（见 run_pipeline）：由 io_threads 个线程预读和写回文件，
+    工作进程只做解析和替换，适合网络存储等 I/O 延迟高的情况。
+    game/tl/<语言> 下的子文件夹也会被处理。
+    profiler 为 tl_profile.Profiler，启用时记录各阶段耗时和每个文件的统计。
+    """
+    profiler = profiler or Profiler("import")
+    logger.info("开始更新语言 %s 的翻译。", "、".join(languages))
 
-    except FileNotFoundError:
-        print(f"[{timestamp()}] 错误：找不到 Excel 文件 '{excel_file}'。")
-        return
-    except Exception as e:
-        print(f"[{timestamp()}] 读取 Excel 文件时出错：{type(e).__name__}: {e}\n{traceback.format_exc()}")
+    setup_start = time.perf_counter()
+    store = TranslationStore(store_file) if store_file else None
+    store_version = store.version if store is not None else None
+    indexes = {}
+    tasks = []
+    sizes = []
+    for language in languages:
+        excel_file = combined_file or os.path.join(os.getcwd(), f"{language}.{file_format}")
+        if sharded:
+            excel_file = shard_index_path(excel_file)
+        rpy_dir = os.path.join(os.getcwd(), "game", "tl", language)
+
+        if not os.path.isdir(rpy_dir):
+            logger.error("目录 '%s' 不存在。", rpy_dir)
+            continue
+
+        sources = None
+        if store is not None and changed_only:
+            sources = store.changed_sources(language, store.last_import(language))
+            logger.info("%s：翻译库中上次导入之后有改动的文件 %d 个。", language, len(sources))
+
+        try:
+            # 翻译记录边读边写入索引，不在内存中保留整张表
+            with profiler.phase("workbook_load"):
+                if store is not None:
+                    translations = iter_store_translations(store, language, sources)
+                else:
+                    translations = read_translations(excel_file, language if combined_file else None,
+                                                     max_workers, serial_threshold)
+                dialogue_index, strings_index = build_translation_index(translations, language)
+        except FileNotFoundError:
+            logger.error("找不到 Excel 文件 '%s'。", excel_file)
+            continue
+        except Exception as e:
+            logger.error("读取 Excel 文件时出错：%s: %s\n%s", type(e).__name__, e, traceback.format_exc())
+            continue
+
+        logger.info("%s：处理 Excel 数据完成。索引了 %d 条对话翻译、%d 条字符串翻译。",
+                    language, len(dialogue_index), len(strings_index))
+        indexes[language] = (dialogue_index, strings_index)
+
+        with profiler.phase("walk"):
+            rpy_files = sorted(path for path in scan_rpy_files(rpy_dir)
+                               if sources is None or os.path.relpath(path, rpy_dir).replace(os.sep, "/") in sources)
+            tasks.extend((language, filepath) for filepath in rpy_files)
+            sizes.extend(os.path.getsize(filepath) for filepath in rpy_files)
+        logger.info("%s：找到 %d 个 .rpy 文件。", language, len(rpy_files))
+
+    if not tasks:
+        if store is not None:
+            finish_store_import(store, indexes, store_version)
+        logger.info("语言 %s 的翻译更新完成。", "、".join(languages))
         return
 
-    print(f"[{timestamp()}] 处理 Excel 数据完成。加载了 {len(all_translations)} 条翻译。")
+    with profiler.phase("ipc_serialize"):
+        payload = pickle.dumps(indexes, protocol=pickle.HIGHEST_PROTOCOL)
 
-    rpy_files = [os.path.join(rpy_dir, f) for f in os.listdir(rpy_dir) if f.endswith(".rpy")]
-    print(f"[{timestamp()}] 找到 {len(rpy_files)} 个 .rpy 文件。")
+    plan = plan_schedule(sizes, max_workers, batch_bytes, serial_threshold)
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=multiprocessing.cpu_count() * 2) as executor:
-        futures = [executor.submit(process_file, filepath, language, all_translations) for filepath in rpy_files]
-        print(f"[{timestamp()}] 已将所有文件提交到进程池。")
+    task_bytes = sum(len(pickle.dumps(task, protocol=pickle.HIGHEST_PROTOCOL)) for task in tasks)
+    result_bytes = 0
+    content_bytes = [0, 0]  # 流水线模式中随任务发送和返回的文件内容
+    touched_files = {language: [] for language in indexes}
+    file_counts = {language: 0 for language in indexes}
+    errors = {language: 0 for language in indexes}
+    worker_setup_seconds = 0.0
+    work_seconds = 0.0
 
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                print(f"[{timestamp()}] 处理文件时发生错误：{type(e).__name__}: {e}\n{traceback.format_exc()}")
+    main_setup_seconds = time.perf_counter() - setup_start
+    logger.info("%s。", describe_plan(plan))
+
+    initargs = (payload, effective_level(), profiler.worker_options())
+    if io_threads:
+        logger.info("使用流水线：%d 个 I/O 线程读取和写回文件。", io_threads)
+        results = pipeline_results(tasks, plan, io_threads, initargs, content_bytes)
+    else:
+        results = run_scheduled(_process_file_task, tasks, plan, _init_worker, initargs)
+    for index, result in profiler.iterate(results, "ipc_wait"):
+        language, filepath = tasks[index]
+        result_bytes += len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        elapsed, setup_seconds, error, written, records, stats = result
+        work_seconds += elapsed
+        worker_setup_seconds += setup_seconds
+        file_counts[language] += 1
+        replay(logger, records)
+        profiler.add_file(stats)
+        if error:
+            errors[language] += 1
+            logger.error("处理文件 '%s' 时发生错误：%s", filepath, error)
+        if written:
+            touched_files[language].append(os.path.relpath(filepath, os.getcwd()).replace(os.sep, "/"))
+
+    # 流水线模式中文件内容随任务发送、新内容随结果返回，计入任务参数和返回结果
+    task_bytes += content_bytes[0]
+    result_bytes += content_bytes[1]
+    logger.info("IPC 统计：初始化数据 %d 字节 × %d 个进程，任务参数 %d 字节，返回结果 %d 字节。",
+                 len(payload), plan.processes, task_bytes, result_bytes)
+    profiler.count("ipc_payload_bytes", len(payload) * plan.processes)
+    profiler.count("ipc_task_bytes", task_bytes)
+    profiler.count("ipc_result_bytes", result_bytes)
+    profiler.add_worker_phase("setup", worker_setup_seconds)
+    logger.info("耗时统计：主进程准备（读取 Excel 并构建索引） %.3f 秒，工作进程初始化 %.3f 秒，文件处理 %.3f 秒（各进程累计）。",
+                main_setup_seconds, worker_setup_seconds, work_seconds)
 
-    print(f"[{timestamp()}] 语言 {language} 的翻译更新完成。")
+    for language, touched in touched_files.items():
+        # 文件按完成顺序返回，清单中按路径排序
+        touched.sort()
+        manifest_file = os.path.join(os.getcwd(), f"{language}.import_manifest.json")
+        with profiler.phase("manifest"):
+            write_manifest(manifest_file, language, touched)
+        logger.info("%s：共写入 %d 个文件，其余 %d 个文件内容未变，未写入%s。清单已保存到 %s。",
+                    language, len(touched), file_counts[language] - len(touched),
+                    f"（其中 {errors[language]} 个文件出错）" if errors[language] else "", manifest_file)
+    if store is not None:
+        finish_store_import(store, [language for language in indexes if not errors[language]], store_version)
+    logger.info("语言 %s 的翻译更新完成。", "、".join(indexes))
+
+def pipeline_results(tasks, plan, io_threads, initargs, content_bytes):
+    """
+    用 run_pipeline 处理 tasks（按调度计划从大到小），生成与 run_scheduled 中 _process_file_task 形式相同的
+    (任务下标, 结果)；写入的结果记入日志记录。
+    content_bytes 为 [发送给工作进程的文件内容字节数, 工作进程返回的新内容字节数]，处理过程中累加，用于 IPC 统计。
+    """
+    order = [index for batch in plan.batches for index in batch]
+    ordered = [tasks[index] for index in order]
+    for position, result, (written, write_error) in run_pipeline(
+            ordered, _read_file_task, _patch_file_task, _write_file_task, plan.processes, io_threads,
+            _init_worker, initargs):
+        elapsed, setup_seconds, error, replaced, new_raw, records, stats, received = result
+        content_bytes[0] += received
+        content_bytes[1] += len(new_raw) if new_raw is not None else 0
+        filepath = ordered[position][1]
+        if written:
+            records.append((logging.INFO, f"{filepath}：替换 {replaced} 行，文件已更新。"))
+        elif write_error:
+            error = f"写入失败：{write_error}"
+        yield order[position], (elapsed, setup_seconds, error, written, records, stats)
+
+def update_rpy_translations(language, max_workers=None, batch_bytes=None, file_format="xlsx", profiler=None,
+                            serial_threshold=None):
+    """更新一种语言的翻译，参数含义见 update_languages。"""
+    update_languages([language], max_workers, batch_bytes, file_format, profiler, serial_threshold)
 
 if __name__ == "__main__":
-    language = input("请输入目标语言代码（例如：cchinese）：")
-    update_rpy_translations(language)
+    parser = argparse.ArgumentParser(description="将 Excel 中的翻译导入到 game/tl/<语言> 下的 .rpy 文件。")
+    parser.add_argument("language", nargs="*", help="目标语言代码（例如：cchinese），可以给出多个；省略时交互输入")
+    parser.add_argument("--all", action="store_true", help="导入 game/tl 下的全部语言文件夹")
+    parser.add_argument("--combined", metavar="FILE.xlsx", default=None,
+                        help="从同一个 xlsx 文件中与语言同名的工作表读取翻译（export.py --combined 的输出）")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), default="xlsx",
+                        help="翻译表格的格式，默认 xlsx")
+    parser.add_argument("--shards", action="store_true",
+                        help="从分片索引 <语言>.shards.json 列出的各分片并行读取翻译（export.py --shard-rows 的输出）")
+    parser.add_argument("--store", metavar="FILE.sqlite", default=None,
+                        help="从 SQLite 翻译库（export.py --store 的输出）查询翻译，不读取表格")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="与 --store 一起使用：只处理上次导入之后翻译库中有改动的行所在的文件")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视模式：常驻运行，表格或 game/tl 下的 .rpy 文件变化时只重新应用有改动的部分（只支持一种语言）；"
+                             "同时给出 --store 时，外部修改的 .rpy 文件会重新导出到翻译库")
+    parser.add_argument("--interval", type=float, default=1.0, help="监视模式的轮询间隔（秒），默认 1")
+    parser.add_argument("--io-threads", type=int, default=None, metavar="N",
+                        help="使用读取、计算、写入重叠的流水线，由 N 个线程预读和写回文件（适合网络存储）")
+    add_schedule_arguments(parser)
+    add_logging_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+    setup_logging(args.verbose, args.log_file)
+
+    if args.all:
+        languages = list_languages(os.path.join(os.getcwd(), "game", "tl"))
+    else:
+        languages = args.language or input("请输入目标语言代码，多个用空格分隔（例如：cchinese）：").split()
+    if args.watch:
+        if len(languages) != 1 or args.combined or args.shards:
+            logger.error("监视模式只支持一种语言的单个表格。")
+            exit()
+        watch_language(languages[0], os.path.join(os.getcwd(), f"{languages[0]}.{args.format}"), args.interval, args.store)
+        exit()
+
+    profiler = profiler_from_args("import", args)
+    profiler.start()
+    options = schedule_options(args)
+    update_languages(languages, max_workers=options["workers"], batch_bytes=options["batch_bytes"],
+                     file_format=args.format, profiler=profiler, serial_threshold=options["serial_threshold"],
+                     combined_file=args.combined, sharded=args.shards, store_file=args.store,
+                     changed_only=args.changed_only, io_threads=args.io_threads)
+    profiler.finish(logger)
     print("程序结束。")
@@ -1,219 +1,430 @@
 import os
 import re
 import openpyxl
-from openpyxl.utils import get_column_letter
-import multiprocessing
 import time  # 确保这一行存在！
-from multiprocessing import Manager, Pool
+import argparse
+import bisect
+from collections import namedtuple
 from tqdm import tqdm
-import concurrent.futures
-
-# 优化后的正则表达式 (保持不变)
-DIALOGUE_PATTERN = re.compile(
-    r"(\w+)?\s+\"(.*?)\"(?=\s*\n|$)|^\s*\"(.*?)\"(?=\s*\n|$)", re.MULTILINE
-)
-IF_BLOCK_PATTERN = re.compile(
-    r"(?s)(^\s*(if|elif|else)\s(.*?):.*?(?=\n\s*[a-zA-Z#]|\Z))", re.MULTILINE
-)
-
-
-def build_translation_map(excel_file):
-    """构建翻译映射和 Excel 行索引映射"""
-    workbook = openpyxl.load_workbook(excel_file)
-    sheet = workbook.active
-    translation_map = {}
-    excel_row_index_map = {}  # 新增：Excel 行索引映射
-
-    for row_index, row in enumerate(sheet.iter_rows(min_row=2), start=2): # enumerate to get row_index
-        prefix, original, translation, _, location, identifier = [
-            cell.value for cell in row
-        ]
+from rpy_tokenizer import parse_say, scan_string, open_lines
+from tl_formats import COLUMNS, FORMATS, TableWriter, iter_rows, table_format, read_columns, parse_occurrences
+from tl_log import get_logger, setup_logging, add_logging_arguments, effective_level, init_worker_logging, LogBuffer, replay
+from tl_profile import Profiler, FileProfile, init_worker_profiling, worker_task, add_profiling_arguments, profiler_from_args
+from tl_shards import is_shard_index, read_shard_index, shard_index_path, map_tables
+from tl_schedule import plan_schedule, describe_plan, run_scheduled, add_schedule_arguments, schedule_options
+
+# 条件语句，例如 "if flag:"、"elif x > 1:"、"else:"（匹配对象为去除缩进和行尾注释后的代码）
+CONDITION_PATTERN = re.compile(r"(if|elif)\s+(.+):$")
+ELSE_PATTERN = re.compile(r"else\s*:$")
+# 注释的开始或字符串字面量的开始
+COMMENT_OR_QUOTE = re.compile(r"[#\"']")
+
+# 条件块树中的一个节点：line 为条件语句所在行号（0 起始），conditions 为从最外层到本层各层实际生效的条件，
+# branches 为同一条 if/elif/else 链中到本分支为止各分支自身的条件（用于推导后续 elif/else 的条件）
+ConditionBlock = namedtuple("ConditionBlock", "line indent keyword branches conditions parent")
+
+logger = get_logger("mark")
+
+
+def strip_comment(code):
+    """去掉行尾注释；跳过字符串字面量（scan_string），字符串里的 # 不算注释。字符串未闭合时保持原样。"""
+    index = 0
+    while True:
+        match = COMMENT_OR_QUOTE.search(code, index)
+        if match is None:
+            return code
+        if match.group() == "#":
+            return code[:match.start()].rstrip()
+        scanned = scan_string(code, match.start())
+        if scanned is None:
+            return code
+        index = scanned[1]
+
+
+def build_condition_tree(lines):
+    """
+    单遍扫描脚本的各行，按缩进构建 if/elif/else 条件块树。
+    返回与 lines 等长的列表，第 i 项为第 i 行所在的最内层条件块（不在任何条件块中时为 None）。
+    elif 的条件为前面各分支均不成立且自身成立，else 的条件为前面各分支均不成立。
+    """
+    line_blocks = [None] * len(lines)
+    stack = []  # 当前打开的条件块，缩进严格递增
+    for line_index, line in enumerate(lines):
+        code = line.strip()
+        if not code or code.startswith("#"):
+            line_blocks[line_index] = stack[-1] if stack else None
+            continue
+
+        indent = len(line) - len(line.lstrip())
+        sibling = None  # 与当前行缩进相同、刚刚结束的条件块
+        while stack and stack[-1].indent >= indent:
+            closed = stack.pop()
+            if closed.indent == indent:
+                sibling = closed
+        parent = stack[-1] if stack else None
+        line_blocks[line_index] = parent
+
+        code = strip_comment(code)
+        condition_match = CONDITION_PATTERN.match(code)
+        if condition_match:
+            keyword, condition = condition_match.group(1), condition_match.group(2).strip()
+            if keyword == "elif" and sibling is not None and sibling.keyword != "else":
+                branches = sibling.branches + (condition,)
+                effective = " and ".join([f"not ({branch})" for branch in sibling.branches] + [f"({condition})"])
+            else:
+                keyword = "if"
+                branches = (condition,)
+                effective = condition
+        elif ELSE_PATTERN.match(code) and sibling is not None and sibling.keyword != "else":
+            keyword = "else"
+            branches = sibling.branches
+            effective = " and ".join(f"not ({branch})" for branch in branches)
+        else:
+            continue
+
+        conditions = (parent.conditions if parent is not None else ()) + (effective,)
+        stack.append(ConditionBlock(line_index, indent, keyword, branches, conditions, parent))
+    return line_blocks
+
+
+def combine_conditions(conditions):
+    """将从外到内的各层条件合并为写入“特殊”列的一个条件。"""
+    if len(conditions) == 1:
+        return conditions[0]
+    return " and ".join(f"({condition})" for condition in conditions)
+
+
+def read_excel_rows(excel_file, keep_workbook=False):
+    """
+    读取表格活动工作表的各行，返回 (工作簿, 各行的值列表)。
+    xlsx 且 keep_workbook 为 True 时以普通模式打开工作簿并返回该对象，update_excel_conditions 直接在其上
+    修改单元格后保存，整个过程只打开一次工作簿；否则工作簿为 None，xlsx 以只读流式模式只读取活动工作表
+    （分片在工作进程中读取，无法把工作簿对象传回主进程）。
+    csv/tsv/jsonl/parquet 等格式第一行为表头（去重表格保留追加的两列）。
+    """
+    if table_format(excel_file) != "xlsx":
+        columns = read_columns(excel_file)
+        return None, [list(columns)] + list(iter_rows(excel_file, columns=columns))
+    if keep_workbook:
+        workbook = openpyxl.load_workbook(excel_file)
+        return workbook, [list(row) for row in workbook.active.iter_rows(values_only=True)]
+    workbook = openpyxl.load_workbook(excel_file, read_only=True)
+    try:
+        return None, [list(row) for row in workbook.active.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def build_translation_map(rows):
+    """
+    构建按源文件名分区的 Excel 行索引映射：文件名 -> {(前缀, 原文): 匹配到的 Excel 行号列表}。
+    每个工作进程只需要其所处理文件的那一部分。
+    去重表格（export.py --dedupe）中出现多次的行会加入每一处出现所在文件的映射，且每个文件中都按出现次数重复记录，
+    因此这样的行总会被标记为 repeat：一条共用的译文无法只对应其中一处的条件。
+    """
+    file_row_index_maps = {}
+
+    for row_index, row in enumerate(rows[1:], start=2): # 第一行为表头
+        row = row + [None] * (8 - len(row))
+        prefix, original, translation, _, location, identifier, _, occurrences = row[:8]
         prefix = prefix if prefix else ""
         if prefix != "strings" and location is not None:
-            key = (prefix, original, location.split(":")[0])
-            translation_map[key] = translation
-
-            # 构建 excel_row_index_map
-            if key not in excel_row_index_map:
-                excel_row_index_map[key] = [] # Initialize as a list to handle multiple matches
-            excel_row_index_map[key].append(row_index) # Store the row_index
-
-    return translation_map, sheet, excel_row_index_map # return excel_row_index_map as well
-
-
-def process_rpy_file(rpy_file_path, translation_map, excel_row_index_map, rows_to_modify, sheet): # add excel_row_index_map as argument
-    """处理单个 .rpy 文件"""
-    print(f"\n--- 处理文件: {rpy_file_path} ---")
-    try:
-        with open(rpy_file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        lines = content.splitlines()
-        if_blocks = IF_BLOCK_PATTERN.finditer(content)
-
-        current_if_condition = None
-        for if_block_match in if_blocks:
-            statement = if_block_match.group(0)
-            condition = if_block_match.group(3).strip()
-            if_block_start_line_index = content.count("\n", 0, if_block_match.start())
-
-            if statement.lstrip().startswith("if"):
-                current_if_condition = condition
-            elif statement.lstrip().startswith("elif"):
-                pass
-            elif statement.lstrip().startswith("else"):
-                condition = f"not ({current_if_condition})"
-
-            print(f"  匹配到条件语句:\n{statement}")
-            print(f"    语句起始行号: {if_block_start_line_index + 1}")
-            print(f"    提取到条件: {condition}")
-
-
-            if_line_indentation = (
-                len(lines[if_block_start_line_index])
-                - len(lines[if_block_start_line_index].lstrip())
-            )
-            block_lines = []
-            for line_index in range(
-                if_block_start_line_index + 1, len(lines)
-            ):
-                current_line = lines[line_index]
-                current_indentation = (
-                    len(current_line) - len(current_line.lstrip())
-                )
-                if (
-                    current_indentation > if_line_indentation
-                ):
-                    block_lines.append(current_line)
-                else:
-                    break
-
-            for block_line in block_lines:
-                original_line = block_line.strip()
-                original = original_line
-
-                original = original.split("#")[0].strip()
-
-                if not original:
-                    continue
-                if original.startswith("$"):
-                    continue
-                if '"' not in original_line:
-                    continue
-                if original == "menu:":
-                    continue
-
-                dialogue_match = DIALOGUE_PATTERN.match(original)
-
-                if dialogue_match:
-                    prefix = (
-                        dialogue_match.group(1)
-                        if dialogue_match.group(1)
-                        else ""
+            locations = [other for other, _ in parse_occurrences(occurrences)] or [location]
+            for file_name in dict.fromkeys(other.split(":")[0] for other in locations):
+                file_map = file_row_index_maps.setdefault(file_name, {})
+                file_map.setdefault((prefix, original), []).extend([row_index] * len(locations)) # 同一个键可能对应多行
+
+    return file_row_index_maps
+
+
+def iter_conditional_dialogue(lines, line_blocks):
+    """生成位于条件块中的对话语句：(行号, 前缀, 原文, 条件)，line_blocks 为 build_condition_tree 的结果。"""
+    for line_index, block_line in enumerate(lines):
+        block = line_blocks[line_index]
+        if block is None:
+            continue
+
+        original = block_line.strip()
+        if not original or original.startswith("#"):
+            continue
+        if original.startswith("$"):
+            continue
+        if '"' not in original:
+            continue
+        if original == "menu:":
+            continue
+
+        say = parse_say(block_line)
+        if say is None or strip_comment(say[3].strip()).endswith(":"):
+            # 不是对话语句，或者是菜单选项等以冒号结尾的语句
+            continue
+        _, prefix, original, _ = say
+        yield line_index, prefix, original.strip(), combine_conditions(block.conditions)
+
+
+def match_conditions(excel_row_index_map, dialogue, file_name, log=None):
+    """
+    把一个源文件中条件块内的对话（iter_conditional_dialogue 的结果）与表格行对应，
+    返回 (需要修改的 (Excel 行号, 条件) 列表, 匹配数, 未找到数)。
+    excel_row_index_map 只包含本文件的部分：(前缀, 原文) -> Excel 行号列表。
+    由于键本身就按文件区分，是否 repeat 只需看本文件内同一个键对应的行数。
+    """
+    log = log or logger
+    rows_to_modify = []
+    matched = 0
+    missing = 0
+    for line_index, prefix, original, condition in dialogue:
+        log.debug("  Dialogue Match: Prefix='%s', Original='%s'", prefix, original)
+        log.debug("    行号: %d, 条件: %s, 文件名: %s", line_index + 1, condition, file_name)
+
+        key = (prefix, original)
+        if key in excel_row_index_map: # Directly use pre-indexed row indices
+            matched += 1
+            excel_row_indices = excel_row_index_map[key]
+            if len(excel_row_indices) > 1: # 检查是否匹配到多个 Excel 行
+                log.debug("    匹配到多个 Excel 行 %s，标记为 'repeat'", excel_row_indices)
+                for excel_row_index in excel_row_indices:
+                    rows_to_modify.append(
+                        (excel_row_index, "repeat") # 直接填入 "repeat"
                     )
-                    if not prefix:
-                        prefix = ""
-                        original = (
-                            dialogue_match.group(3).strip()
-                            if dialogue_match.group(3)
-                            else ""
-                        )
-                    else:
-                        original = (
-                            dialogue_match.group(2).strip()
-                            if dialogue_match.group(2)
-                            else ""
-                        )
-                    print(f"  [DEBUG] Dialogue Match: Prefix='{prefix}', Original='{original}'")
-
-                    file_name = os.path.basename(rpy_file_path)
-                    key = (prefix, original, file_name)
-                    print(
-                        f"    前缀: {prefix}, 原文: {original}, 文件名: {file_name}"
+            else: # 只有一个匹配行，按原逻辑处理
+                log.debug("    匹配到 Excel 行 %s", excel_row_indices)
+                for excel_row_index in excel_row_indices:
+                    rows_to_modify.append(
+                        (excel_row_index, condition)
                     )
-
-                    if key in translation_map:
-                        print(f"    [DEBUG] Key '{key}' found in translation_map")
-                        if key in excel_row_index_map: # Directly use pre-indexed row indices
-                            excel_row_indices = excel_row_index_map[key]
-                            print(f"    [DEBUG] Found excel_row_indices from index: {excel_row_indices}")
-                            if len(excel_row_indices) > 1: # 检查是否匹配到多个 Excel 行
-                                print(f"    [DEBUG] 匹配到多个 Excel 行，标记为 'repeat'")
-                                for excel_row_index in excel_row_indices:
-                                    rows_to_modify.append(
-                                        (excel_row_index, "repeat") # 直接填入 "repeat"
-                                    )
-                                    print(f"    [DEBUG] Added to rows_to_modify (repeat): row_index={excel_row_index}, condition='repeat'")
-                            else: # 只有一个匹配行，按原逻辑处理
-                                for excel_row_index in excel_row_indices:
-                                    rows_to_modify.append(
-                                        (excel_row_index, condition)
-                                    )
-                                    print(f"    [DEBUG] Added to rows_to_modify: row_index={excel_row_index}, condition='{condition}'")
-                        else: # 这部分应该不会发生，除非索引构建有问题
-                             print(f"      [ERROR] Key '{key}' not found in excel_row_index_map, but found in translation_map. Indexing issue?")
-                    else:
-                        print(f"      键值 {key} 未在翻译映射中找到")
-                else:
-                    prefix = ""
-                    print(f"  标记为无前缀")
-
+        else:
+            missing += 1
+            log.debug("    键值 %s 未在翻译映射中找到", key)
+    return rows_to_modify, matched, missing
+
+
+def process_rpy_file(rpy_file_path, excel_row_index_map, log=None, profile=None):
+    """
+    处理单个 .rpy 文件，返回需要修改的 (Excel 行号, 条件) 列表，匹配规则见 match_conditions。
+    log 为日志输出对象，工作进程中传入 LogBuffer，默认直接使用模块的 logger；
+    profile 为 FileProfile，记录读取、解析、匹配各阶段的耗时。
+    """
+    log = log or logger
+    profile = profile or FileProfile(rpy_file_path)
+    log.debug("--- 处理文件: %s ---", rpy_file_path)
+    try:
+        with profile.phase("read"):
+            source = open_lines(rpy_file_path)
+        with source as lines:
+            with profile.phase("parse"):
+                line_blocks = build_condition_tree(lines)
+            with profile.phase("match"):
+                rows_to_modify, matched, missing = match_conditions(
+                    excel_row_index_map, iter_conditional_dialogue(lines, line_blocks), os.path.basename(rpy_file_path), log)
     except Exception as e:
-        print(f"  [ERROR] 文件: {rpy_file_path}, 发生错误: {type(e).__name__} - {e}")
-
-
-def update_excel_conditions(excel_file, rows_to_modify):
-    """更新 Excel 文件中的条件列"""
-    workbook = openpyxl.load_workbook(excel_file)
-    sheet = workbook.active  # 假设始终操作第一个 sheet，如果需要根据 sheet 名操作，需要修改
-    for row_index, condition in tqdm(rows_to_modify, desc="更新 Excel"):
-        condition_cell = sheet.cell(row=row_index, column=4)
-        condition_cell.value = ""
-        condition_cell.value = condition
-    workbook.save(excel_file)
+        log.error("文件: %s, 发生错误: %s - %s", rpy_file_path, type(e).__name__, e)
+        return []
+    profile.count("matched", matched)
+    profile.count("missing", missing)
+    log.info("%s：%d 句条件内的对话匹配到表格，%d 句未找到，标记 %d 行。",
+             rpy_file_path, matched, missing, len(rows_to_modify))
+    return rows_to_modify
+
+
+def scan_source_file(rpy_file_path):
+    """
+    不依赖表格的扫描任务（export.py --mark 在导出的同一个进程池中使用）：
+    返回 (条件块内的对话列表, 日志记录, 剖析统计)，对话列表的每一项见 iter_conditional_dialogue。
+    """
+    log = LogBuffer()
+    profile = FileProfile(rpy_file_path)
+    with worker_task():
+        try:
+            with profile.phase("read"):
+                source = open_lines(rpy_file_path)
+            with source as lines, profile.phase("parse"):
+                dialogue = list(iter_conditional_dialogue(lines, build_condition_tree(lines)))
+        except Exception as e:
+            log.error("文件: %s, 发生错误: %s - %s", rpy_file_path, type(e).__name__, e)
+            dialogue = []
+    profile.count("conditional_dialogue", len(dialogue))
+    log.debug("%s：条件块内有 %d 句对话。", rpy_file_path, len(dialogue))
+    return dialogue, log.records, profile.result()
+
+
+def list_source_files(game_root):
+    """返回 game 目录下（不含 tl）的全部 .rpy 源脚本，按路径排序。"""
+    rpy_files = []
+    for root, dirs, files in os.walk(os.path.join(game_root, "game")):
+        if "tl" in dirs:
+            dirs.remove("tl")
+        for file in files:
+            if file.endswith(".rpy"):
+                rpy_files.append(os.path.join(root, file))
+    rpy_files.sort()
+    return rpy_files
+
+
+def conditions_for_rows(rows, source_files, dialogue_by_file, log=None):
+    """
+    在内存中完成条件修补：rows 为表格各行（第一行为表头），dialogue_by_file 为各源脚本 scan_source_file 得到的对话列表。
+    返回需要修改的 (Excel 行号, 条件) 列表，按源文件顺序排列，结果与 conditional_patch_parallel 相同。
+    """
+    file_row_index_maps = build_translation_map(rows)
+    rows_to_modify = []
+    for source_file, dialogue in zip(source_files, dialogue_by_file):
+        file_name = os.path.basename(source_file)
+        if file_name in file_row_index_maps and dialogue:
+            rows_to_modify.extend(match_conditions(file_row_index_maps[file_name], dialogue, file_name, log)[0])
+    return rows_to_modify
+
+
+def update_excel_conditions(excel_file, workbook, active_rows, rows_to_modify, progress=True):
+    """
+    更新 Excel 文件中的条件列，workbook 与 active_rows 为 read_excel_rows 的结果。
+    只修改值确实变化的“特殊”单元格：xlsx 在工作簿的活动工作表中只写入这些单元格后一次性保存
+    （workbook 为 None 时此时才以普通模式打开），译者添加的填充色、批注、冻结窗格、数据验证等格式都会保留；
+    其他格式重新写出整张表。没有任何单元格变化时不保存。返回修改的单元格数。
+    progress 为 False 时不显示进度条（多个分片同时保存时）。
+    """
+    changed_cells = {}
+    for row_index, condition in rows_to_modify:
+        row = active_rows[row_index - 1]
+        if len(row) < 4:
+            row.extend([None] * (4 - len(row)))
+        if row[3] != condition:
+            row[3] = condition
+            changed_cells[row_index] = condition
+    changed = len(changed_cells)
+    if not changed:
+        return 0
+
+    temp_file = excel_file + ".tmp"
+    file_format = table_format(excel_file)
+    if file_format != "xlsx":
+        with TableWriter(temp_file, file_format, columns=active_rows[0]) as writer:
+            for row in tqdm(active_rows[1:], desc="写入表格", disable=not progress):
+                writer.append(row)
+        os.replace(temp_file, excel_file)
+        return changed
+
+    if workbook is None:
+        workbook = openpyxl.load_workbook(excel_file)
+    sheet = workbook.active
+    for row_index, condition in tqdm(changed_cells.items(), desc="写入表格", disable=not progress):
+        sheet.cell(row=row_index, column=4, value=condition)
+    workbook.save(temp_file)
+    os.replace(temp_file, excel_file)
+    return changed
+
+
+def _update_shard_task(task):
+    """在工作进程中更新一个分片的条件列，task 为 update_excel_conditions 的参数。"""
+    return update_excel_conditions(*task, progress=False)
+
+
+def read_tables(excel_file, workers=None, serial_threshold=None):
+    """
+    读取表格，返回 (表格列表, 合并后的行)。表格列表的每一项为 (文件, 工作簿, 活动工作表的各行, 第一行数据的合并行号)。
+    excel_file 为分片索引（export.py --shard-rows 的输出）时在工作进程中并行流式读取各分片，合并行由表头和各分片的
+    数据行依次拼接，行号在各分片之间连续，有修改的分片在保存时再打开；否则只有一个表格，以普通模式打开一次，
+    合并行就是其活动工作表，保存时复用同一个工作簿对象。
+    """
+    if is_shard_index(excel_file):
+        files = read_shard_index(excel_file)
+        results = map_tables(read_excel_rows, files, files, workers, serial_threshold)
+    else:
+        files = [excel_file]
+        results = [read_excel_rows(excel_file, keep_workbook=True)]
+    tables = []
+    rows = []
+    for file, (workbook, active_rows) in zip(files, results):
+        if not rows:
+            rows.append(active_rows[0] if active_rows else list(COLUMNS))
+        tables.append((file, workbook, active_rows, len(rows) + 1))
+        rows.extend(active_rows[1:])
+    return tables, rows
+
+
+def update_tables(tables, rows_to_modify, workers=None, serial_threshold=None):
+    """把合并行号上的修改分配到各表格，同时保存有修改的表格，返回修改的单元格数。"""
+    starts = [start for _, _, _, start in tables]
+    modifications = [[] for _ in tables]
+    for row_index, condition in rows_to_modify:
+        table_index = bisect.bisect_right(starts, row_index) - 1
+        modifications[table_index].append((row_index - starts[table_index] + 2, condition))
+    if len(tables) == 1:
+        file, workbook, active_rows, _ = tables[0]
+        return update_excel_conditions(file, workbook, active_rows, modifications[0])
+    tasks = [(file, None, active_rows, modified) for (file, _, active_rows, _), modified in zip(tables, modifications)
+             if modified]
+    return sum(map_tables(_update_shard_task, tasks, [task[0] for task in tasks], workers, serial_threshold))
+
+
+def _init_worker(log_level, profile_options):
+    """进程池初始化函数：设置工作进程的日志级别和剖析选项。"""
+    init_worker_logging(log_level)
+    init_worker_profiling(profile_options)
 
 
-def conditional_patch_parallel(game_root: str, excel_file: str):
-    """并行条件修补功能"""
+def process_rpy_file_wrapper(task_args):
+    """包装 process_rpy_file 以适应 imap；日志和剖析统计在工作进程中缓冲，随结果一起返回。"""
+    file, file_row_index_map = task_args
+    log = LogBuffer()
+    profile = FileProfile(file)
+    with worker_task():
+        rows = process_rpy_file(file, file_row_index_map, log, profile)
+    return rows, log.records, profile.result()
+
+
+def conditional_patch_parallel(game_root: str, excel_file: str, profiler: Profiler = None, workers: int = None,
+                               batch_bytes: int = None, serial_threshold: int = None):
+    """
+    并行条件修补功能；profiler 为 tl_profile.Profiler，启用时记录各阶段耗时和每个文件的统计。
+    文件按大小从大到小调度，workers、batch_bytes、serial_threshold 见 tl_schedule。
+    excel_file 也可以是分片索引（export.py --shard-rows 的输出），此时各分片并行读取和保存。
+    """
+    profiler = profiler or Profiler("mark")
     try:
-        print("--- 开始条件修补 (并行) ---")
-        print(f"Excel 文件: {excel_file}")
-        print(f"游戏根目录: {game_root}")
-
-        translation_map, sheet, excel_row_index_map = build_translation_map(excel_file) # Get excel_row_index_map here
-
-        rows_to_modify = Manager().list()
-        game_folder_path = os.path.join(game_root, "game")
-        rpy_files = []
-        for root, dirs, files in os.walk(game_folder_path):
-            if "tl" in dirs:
-                dirs.remove("tl")
-            for file in files:
-                if file.endswith(".rpy"):
-                    rpy_files.append(os.path.join(root, file))
-
-        cpu_count = multiprocessing.cpu_count()
-        print(f"可用 CPU 核心数: {cpu_count}")
-        pool = Pool(processes=cpu_count)
-        tasks = [(file, translation_map, excel_row_index_map, rows_to_modify, sheet) for file in rpy_files] # pass excel_row_index_map to tasks
-
-        with tqdm(total=len(rpy_files), desc="并行处理文件") as pbar:
-            for _ in pool.imap_unordered(process_rpy_file_wrapper, tasks):
+        logger.info("--- 开始条件修补 (并行) ---")
+        logger.info("Excel 文件: %s", excel_file)
+        logger.info("游戏根目录: %s", game_root)
+
+        with profiler.phase("workbook_load"):
+            tables, excel_rows = read_tables(excel_file, workers, serial_threshold)
+        if len(tables) > 1:
+            logger.info("读取了 %d 个分片，共 %d 行。", len(tables), len(excel_rows) - 1)
+        with profiler.phase("index"):
+            file_row_index_maps = build_translation_map(excel_rows)
+
+        with profiler.phase("walk"):
+            rpy_files = list_source_files(game_root)
+
+        # 每个任务只携带其文件对应的那部分映射；Excel 中没有任何行的文件不需要处理
+        tasks = [(file, file_row_index_maps[os.path.basename(file)]) for file in rpy_files
+                 if os.path.basename(file) in file_row_index_maps]
+        logger.info("共 %d 个脚本文件，其中 %d 个在 Excel 中有对应的行。", len(rpy_files), len(tasks))
+
+        plan = plan_schedule([os.path.getsize(file) for file, _ in tasks], workers, batch_bytes, serial_threshold)
+        logger.info("%s。", describe_plan(plan))
+        # 结果按完成顺序返回；按文件顺序合并，使同名文件标记同一行时的结果与调度无关
+        file_rows = [None] * len(tasks)
+        results = run_scheduled(process_rpy_file_wrapper, tasks, plan, _init_worker,
+                                (effective_level(), profiler.worker_options()))
+        with tqdm(total=len(tasks), desc="并行处理文件") as pbar:
+            for index, (rows, records, stats) in profiler.iterate(results, "ipc_wait"):
+                replay(logger, records)
+                profiler.add_file(stats)
+                file_rows[index] = rows
                 pbar.update()
-        pool.close()
-        pool.join()
+        rows_to_modify = [row for rows in file_rows for row in rows]
 
-        update_excel_conditions(excel_file, list(rows_to_modify))
+        with profiler.phase("workbook_save"):
+            changed = update_tables(tables, rows_to_modify, workers, serial_threshold)
+        profiler.count("marked_rows", len(rows_to_modify))
+        profiler.count("changed_cells", changed)
+        logger.info("共标记 %d 行，修改了 %d 个“特殊”单元格。", len(rows_to_modify), changed)
 
-        print("--- 条件修补完成 (并行) ---")
+        logger.info("--- 条件修补完成 (并行) ---")
 
     except Exception as e:
-        print(f"  [ERROR] 并行处理失败: {type(e).__name__} - {e}")
-
-
-def process_rpy_file_wrapper(task_args):
-    """包装 process_rpy_file 以适应 imap_unordered"""
-    file, translation_map, excel_row_index_map, rows_to_modify, sheet = task_args # unpack excel_row_index_map here
-    return process_rpy_file(file, translation_map, excel_row_index_map, rows_to_modify, sheet) # pass excel_row_index_map
+        logger.error("并行处理失败: %s - %s", type(e).__name__, e)
 
 
 if __name__ == "__main__":
@@ -221,16 +432,33 @@ if __name__ == "__main__":
     game_root = "."
     tl_folder = os.path.join(game_root, "game", "tl")
 
-    language_folder = input("请输入要操作的语言文件夹名称 (例如: chinese): ")
+    parser = argparse.ArgumentParser(description="根据游戏脚本中的 if/elif/else 条件填写表格的“特殊”列。")
+    parser.add_argument("language", nargs="?", help="语言文件夹名称（例如：chinese），省略时交互输入")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), default="xlsx",
+                        help="翻译表格的格式，默认 xlsx")
+    parser.add_argument("--shards", action="store_true",
+                        help="读取分片索引 <语言>.shards.json 列出的各分片（export.py --shard-rows 的输出），各分片并行读取和保存")
+    add_schedule_arguments(parser)
+    add_logging_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+    setup_logging(args.verbose, args.log_file)
+
+    language_folder = args.language or input("请输入要操作的语言文件夹名称 (例如: chinese): ")
     language_path = os.path.join(tl_folder, language_folder)
     if not os.path.isdir(language_path):
-        print("指定的语言文件夹不存在！")
+        logger.error("指定的语言文件夹不存在！")
         exit()
 
-    excel_file = os.path.join(game_root, f"{language_folder}.xlsx")
+    excel_file = os.path.join(game_root, f"{language_folder}.{args.format}")
+    if args.shards:
+        excel_file = shard_index_path(excel_file)
 
-    conditional_patch_parallel(game_root, excel_file)
-    print(f"条件修补已完成，结果已保存到 {excel_file}")
+    profiler = profiler_from_args("mark", args)
+    profiler.start()
+    conditional_patch_parallel(game_root, excel_file, profiler, **schedule_options(args))
+    profiler.finish(logger)
+    logger.info("条件修补已完成，结果已保存到 %s", excel_file)
 
     end_time = time.time()
-    print(f"总耗时：{end_time - start_time} 秒")
\ No newline at end of file
+    logger.info("总耗时：%.3f 秒", end_time - start_time)
\ No newline at end of file
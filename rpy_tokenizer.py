@@ -0,0 +1,294 @@
+import io
+import os
+import re
+import mmap
+import codecs
+import contextlib
+from array import array
+from collections import namedtuple
+
+# game/tl 下 .rpy 翻译文件的单遍行级分词器，export.py 与 import.py 共用。
+# 每一行只检查一次，所用的正则都锚定在单行内且没有嵌套量词，
+# 字符串字面量由 scan_string 按转义规则线性扫描，因此耗时与文件大小成正比。
+#
+# 记录中的 start/end 为 0 起始、左闭右开的行号区间；
+# target 为 import.py 需要改写的那一行（对话的译文行或 strings 中的 new 行），不存在时为 None。
+
+# 分词规则或记录结构发生变化时递增，用于使依赖分词结果的缓存失效
+PARSER_VERSION = 1
+
+# 翻译块头，例如 "translate chinese start_a170b500:" 或 "translate chinese strings:"
+BlockHeader = namedtuple("BlockHeader", "start end language identifier location")
+# 来源注释，例如 "# game/script.rpy:95"
+SourceComment = namedtuple("SourceComment", "start end location")
+# 对话：注释中的原文行 "# e \"Hello\"" 加上其后的译文行 "e \"你好\""
+DialogueLine = namedtuple("DialogueLine", "start end block who original translation target head tail")
+# strings 块中的 old/new 对
+StringPair = namedtuple("StringPair", "start end block location original translation target head tail")
+
+# 不小于该大小（字节）的文件用 MappedLines 按需逐行解码，不整体读入内存
+MMAP_THRESHOLD_BYTES = 4 * 1024 * 1024
+
+HEADER_PATTERN = re.compile(r"translate\s+(\w+)\s+(\w+)\s*:\s*$")
+SOURCE_PATTERN = re.compile(r"#\s*([^\s\"#]+:\d+)\s*$")
+WHO_PATTERN = re.compile(r"[\w.@ \t-]*$")
+# 单独的 \r（旧式 Mac 换行）与换行符，MappedLines 按与 decode_lines 相同的规则分行
+LONE_CR_PATTERN = re.compile(rb"\r(?!\n)")
+NEWLINE_PATTERN = re.compile(rb"\r\n?|\n")
+
+
+def scan_string(line, quote_index):
+    """
+    从 line[quote_index] 处的引号（双引号或单引号）开始扫描字符串字面量（支持反斜杠转义），
+    返回 (内容, 结束引号之后的位置)；字符串未闭合时返回 None。
+    """
+    quote = line[quote_index]
+    search_from = quote_index + 1
+    while True:
+        end = line.find(quote, search_from)
+        if end < 0:
+            return None
+        backslash = end - 1
+        while backslash > quote_index and line[backslash] == "\\":
+            backslash -= 1
+        if (end - 1 - backslash) % 2 == 0:
+            return line[quote_index + 1:end], end + 1
+        search_from = end + 1
+
+
+def parse_say(line):
+    """
+    将一行解析为对话语句 `[角色] "文本" [其余部分]`。
+    返回 (引号之前的部分, 角色, 文本, 结束引号之后的部分)，不是对话语句时返回 None。
+    """
+    quote_index = line.find('"')
+    if quote_index < 0:
+        return None
+    head = line[:quote_index]
+    if not WHO_PATTERN.match(head):
+        return None
+    scanned = scan_string(line, quote_index)
+    if scanned is None:
+        return None
+    text, tail_index = scanned
+    tail = line[tail_index:]
+    if "\"" in tail.split("#", 1)[0]:
+        # 同一行中还有其他字符串字面量，不是简单的对话语句
+        return None
+    return head, head.strip(), text, tail
+
+
+def parse_keyword_string(stripped, keyword):
+    """
+    解析 `old "..."` / `new "..."` 这样以关键字开头的行（已去除缩进）。
+    返回 (文本, 开始引号的位置, 结束引号之后的位置)，不匹配时返回 None。
+    """
+    if not stripped.startswith(keyword):
+        return None
+    quote_index = len(keyword)
+    while quote_index < len(stripped) and stripped[quote_index] in " \t":
+        quote_index += 1
+    if not stripped.startswith('"', quote_index):
+        return None
+    scanned = scan_string(stripped, quote_index)
+    if scanned is None:
+        return None
+    return scanned[0], quote_index, scanned[1]
+
+
+def short_location(location):
+    """将 "game/dir/script.rpy:12" 形式的来源缩短为 Excel 中使用的 "script.rpy:12"。"""
+    return location.rsplit("/", 1)[-1] if location else ""
+
+
+def tokenize(lines):
+    """
+    单遍扫描翻译文件的各行，按出现顺序生成 BlockHeader、SourceComment、DialogueLine 与 StringPair 记录。
+    lines 可以带或不带行尾换行符。
+    """
+    block = None  # 当前翻译块
+    kind = None  # 当前块类型："dialogue"、"strings" 或 None（python 等不含文本的块）
+    pending_source = None  # 尚未归属的来源注释
+    original = None  # 对话块中注释形式的原文：(行号, 角色, 文本)
+    pending_old = None  # strings 块中尚未配对的 old 行：(行号, 文本, 来源)
+
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        if not line[0].isspace():
+            # 顶格的行意味着上一个翻译块结束；只有原文没有译文的对话在此时输出
+            if original is not None:
+                yield DialogueLine(original[0], original[0] + 1, block, original[1], original[2], None, None, "", "")
+            original = None
+            pending_old = None
+            block = None
+            kind = None
+            header_match = HEADER_PATTERN.match(stripped)
+            if header_match:
+                location = pending_source.location if pending_source is not None else ""
+                block = BlockHeader(index, index + 1, header_match.group(1), header_match.group(2), location)
+                if block.identifier == "strings":
+                    kind = "strings"
+                elif block.identifier != "python":
+                    kind = "dialogue"
+                pending_source = None
+                yield block
+                continue
+
+        if stripped[0] == "#":
+            source_match = SOURCE_PATTERN.match(stripped)
+            if source_match:
+                pending_source = SourceComment(index, index + 1, source_match.group(1))
+                yield pending_source
+            elif kind == "dialogue" and original is None:
+                # 对话块中第一条注释形式的对话即为原文
+                say = parse_say(stripped[1:])
+                if say is not None:
+                    original = (index, say[1], say[2])
+            continue
+
+        if kind == "dialogue":
+            say = parse_say(line)
+            if say is not None:
+                # 对话块中第一条非注释的对话即为译文，之后的内容不再处理
+                head, who, translation, tail = say
+                if original is not None:
+                    start, who, original_text = original
+                else:
+                    start, original_text = index, None
+                yield DialogueLine(start, index + 1, block, who, original_text, translation, index, head, tail)
+                original = None
+                kind = None
+        elif kind == "strings":
+            old = parse_keyword_string(stripped, "old")
+            if old is not None:
+                source = pending_source.location if pending_source is not None else block.location
+                pending_old = (index, old[0], source)
+                pending_source = None
+                continue
+            new = parse_keyword_string(stripped, "new")
+            if new is not None and pending_old is not None:
+                old_index, original_text, source = pending_old
+                indent_length = len(line) - len(line.lstrip())
+                yield StringPair(
+                    old_index, index + 1, block, source, original_text, new[0], index,
+                    line[:indent_length + new[1]], line[indent_length + new[2]:],
+                )
+                pending_old = None
+
+    if original is not None:
+        yield DialogueLine(original[0], original[0] + 1, block, original[1], original[2], None, None, "", "")
+
+
+def read_lines(path):
+    """以 utf-8（自动去除 BOM）读取文件的全部行，保留行尾换行符。"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return f.readlines()
+
+
+def decode_lines(data):
+    """将文件的原始字节按 utf-8（自动去除 BOM）解码为各行，换行符处理与 read_lines 相同。"""
+    return io.StringIO(data.decode("utf-8-sig"), newline=None).readlines()
+
+
+def encode_lines(lines, original):
+    """
+    将各行编码回字节，沿用 original（文件原始字节）的 BOM 和换行风格，
+    因此没有改动任何行时结果与原始字节完全相同。
+    """
+    text = "".join(lines)
+    if b"\r\n" in original:
+        text = text.replace("\n", "\r\n")
+    data = text.encode("utf-8")
+    return codecs.BOM_UTF8 + data if original.startswith(codecs.BOM_UTF8) else data
+
+
+class MappedLines:
+    """
+    以 mmap 映射整个文件，先按字节查找换行符建立行首偏移索引，之后按行号逐行解码（去除 BOM 和行尾换行符）。
+    文件内容不会被整体解码为 str 或拆分为行列表，每个进程只额外占用偏移索引（每行 8 字节）和当前行的内存；
+    行号直接由索引给出。分行规则与 decode_lines 相同（\\n、\\r\\n 和单独的 \\r），
+    因此文件大小越过 MMAP_THRESHOLD_BYTES 时行号和分词结果不变。可以直接传给 tokenize 或 mark.py 的条件扫描，用完需要 close。
+    各行仍然整行解码后交给 tokenize：分词规则依赖 Unicode 语义（\\w 匹配中文角色名、str.isspace 识别全角空格缩进），
+    只按字节匹配、只解码捕获字段无法保证结果与 tokenize 一致。
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        start = len(codecs.BOM_UTF8) if self.data[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8 else 0
+        # 第 i 行为 data[offsets[i]:offsets[i + 1]]，最后一项为文件末尾
+        offsets = array("q", [start])
+        if LONE_CR_PATTERN.search(self.data, start) is None:
+            find = self.data.find
+            position = find(b"\n", start)
+            while position >= 0:
+                offsets.append(position + 1)
+                position = find(b"\n", position + 1)
+        else:
+            offsets.extend(match.end() for match in NEWLINE_PATTERN.finditer(self.data, start))
+        if offsets[-1] < size:
+            offsets.append(size)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return _decode_line(self.data[self.offsets[index]:self.offsets[index + 1]])
+
+    def __iter__(self):
+        data, offsets = self.data, self.offsets
+        for start, end in zip(offsets, offsets[1:]):
+            yield _decode_line(data[start:end])
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _decode_line(line):
+    """解码一行的字节并去除行尾的 \\r\\n、\\n 或 \\r。"""
+    if line.endswith(b"\n"):
+        line = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+    elif line.endswith(b"\r"):
+        line = line[:-1]
+    return line.decode("utf-8")
+
+
+def open_lines(path, threshold=MMAP_THRESHOLD_BYTES):
+    """
+    返回可用于 with 语句的各行（不含行尾换行符）：不小于 threshold 的文件使用 MappedLines，
+    其余文件直接读入后用 decode_lines 分行；两种方式的分行规则相同。
+    """
+    if os.path.getsize(path) >= threshold:
+        return MappedLines(path)
+    with open(path, "rb") as f:
+        return contextlib.nullcontext([line.rstrip("\n") for line in decode_lines(f.read())])
+
+
+def tokenize_file(path):
+    """读取并分词一个文件，返回 (各行, 记录列表)。"""
+    lines = read_lines(path)
+    return lines, list(tokenize(lines))
+
+
+if __name__ == "__main__":
+    import sys
+
+    for path in sys.argv[1:]:
+        print(f"--- {os.path.relpath(path)} ---")
+        for record in tokenize_file(path)[1]:
+            print(f"  {type(record).__name__} {record.start + 1}-{record.end}: "
+                  + ", ".join(f"{k}={v!r}" for k, v in record._asdict().items() if k not in ("start", "end", "block")))
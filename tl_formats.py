@@ -0,0 +1,261 @@
+import os
+import csv
+import json
+import argparse
+import openpyxl
+from openpyxl.utils import get_column_letter
+
+# 三个脚本交换数据所用的六列；各格式的列名和列顺序完全一致
+COLUMNS = ["前缀", "原文", "译文", "特殊", "定位", "标识"]
+# 去重导出（export.py --dedupe）在六列之后追加的两列：出现次数，以及每处出现的 "定位 标识"（每行一处，xlsx 中隐藏）
+DEDUP_COLUMNS = COLUMNS + ["次数", "出现位置"]
+FORMATS = {".xlsx": "xlsx", ".csv": "csv", ".tsv": "tsv", ".jsonl": "jsonl", ".parquet": "parquet"}
+# Parquet 每个行组的行数，写入时按行组分批落盘，内存占用不随总行数增长
+PARQUET_BATCH_ROWS = 10000
+
+
+def table_format(path):
+    """根据扩展名判断表格格式。"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"不支持的文件格式：{path}（支持 {', '.join(FORMATS)}）")
+    return FORMATS[ext]
+
+
+def normalize_row(row, width=6):
+    """将一行补齐或截断为 width 列（默认六列），空字符串视为空单元格（None），与 xlsx 的读取结果一致。"""
+    row = list(row[:width]) + [None] * (width - len(row))
+    return [None if value == "" else value for value in row]
+
+
+def format_occurrences(occurrences):
+    """把 (定位, 标识) 列表写成 "出现位置" 列的内容：每行一处，标识为空时只写定位。"""
+    return "\n".join(f"{location} {identifier}" if identifier else location for location, identifier in occurrences)
+
+
+def parse_occurrences(text):
+    """解析 "出现位置" 列，返回 (定位, 标识) 列表；标识为空时为 None。"""
+    occurrences = []
+    for line in (text or "").splitlines():
+        parts = line.split()
+        if parts:
+            occurrences.append((parts[0], parts[1] if len(parts) > 1 else None))
+    return occurrences
+
+
+def set_column_layout(sheet, columns):
+    """设置 xlsx 工作表的列宽：六列各宽 25，次数列较窄，出现位置列隐藏。只写模式下必须在写入数据之前调用。"""
+    for col, name in enumerate(columns, start=1):
+        dimension = sheet.column_dimensions[get_column_letter(col)]
+        if name == "次数":
+            dimension.width = 8
+        elif name == "出现位置":
+            dimension.width = 40
+            dimension.hidden = True
+        else:
+            dimension.width = 25
+
+
+def _create_xlsx_sheet(workbook, title=None, columns=COLUMNS):
+    """在只写模式的工作簿中新建工作表：设置列宽并写入表头。"""
+    sheet = workbook.create_sheet(title)
+    set_column_layout(sheet, columns)
+    sheet.append(list(columns))
+    return sheet
+
+
+def _import_pyarrow():
+    """Parquet 依赖可选的 pyarrow，只在用到时导入。"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("读写 Parquet 需要安装 pyarrow：pip install pyarrow") from None
+    return pyarrow, pyarrow.parquet
+
+
+class TableWriter:
+    """
+    按行流式写入六列表格，第一行为表头。支持 xlsx、csv、tsv、jsonl 和 parquet（需要 pyarrow）。
+    columns 为列名，去重导出时为 DEDUP_COLUMNS。
+    """
+
+    def __init__(self, path, file_format=None, columns=COLUMNS):
+        self.path = path
+        self.format = file_format or table_format(path)
+        self.columns = list(columns)
+        self.rows_written = 0
+        if self.format == "xlsx":
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._sheet = _create_xlsx_sheet(self._workbook, columns=self.columns)
+        elif self.format in ("csv", "tsv"):
+            # 带 BOM 的 UTF-8，Excel 可以直接打开
+            self._file = open(path, "w", encoding="utf-8-sig", newline="")
+            self._writer = csv.writer(self._file, delimiter="," if self.format == "csv" else "\t")
+            self._writer.writerow(self.columns)
+        elif self.format == "jsonl":
+            self._file = open(path, "w", encoding="utf-8")
+        elif self.format == "parquet":
+            pyarrow, parquet = _import_pyarrow()
+            self._schema = pyarrow.schema([(name, pyarrow.string()) for name in self.columns])
+            self._writer = parquet.ParquetWriter(path, self._schema)
+            self._batch = []
+
+    def append(self, row):
+        """写入一行（列数与 columns 相同）。"""
+        row = normalize_row(row, len(self.columns))
+        if self.format == "xlsx":
+            self._sheet.append(row)
+        elif self.format in ("csv", "tsv"):
+            self._writer.writerow(["" if value is None else value for value in row])
+        elif self.format == "jsonl":
+            self._file.write(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + "\n")
+        elif self.format == "parquet":
+            self._batch.append(row)
+            if len(self._batch) >= PARQUET_BATCH_ROWS:
+                self._flush_parquet()
+        self.rows_written += 1
+
+    def _flush_parquet(self):
+        if not self._batch:
+            return
+        pyarrow, _ = _import_pyarrow()
+        columns = [[None if row[i] is None else str(row[i]) for row in self._batch] for i in range(len(self.columns))]
+        self._writer.write_table(pyarrow.Table.from_arrays(columns, schema=self._schema))
+        self._batch = []
+
+    def close(self):
+        if self.format == "xlsx":
+            self._workbook.save(self.path)
+        elif self.format in ("csv", "tsv", "jsonl"):
+            self._file.close()
+        elif self.format == "parquet":
+            self._flush_parquet()
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _SheetWriter:
+    """WorkbookWriter 中的一个工作表，接口与 TableWriter 相同；close 不做任何事，由 WorkbookWriter 统一保存。"""
+
+    def __init__(self, sheet, columns):
+        self._sheet = sheet
+        self.columns = list(columns)
+        self.rows_written = 0
+
+    def append(self, row):
+        self._sheet.append(normalize_row(row, len(self.columns)))
+        self.rows_written += 1
+
+    def close(self):
+        pass
+
+
+class WorkbookWriter:
+    """把多个六列表格流式写入同一个 xlsx 文件，每个表格一个工作表（例如每种语言一个工作表）。"""
+
+    def __init__(self, path):
+        if table_format(path) != "xlsx":
+            raise ValueError(f"只有 xlsx 支持多个工作表：{path}")
+        self.path = path
+        self._workbook = openpyxl.Workbook(write_only=True)
+
+    def sheet(self, title, columns=COLUMNS):
+        """新建名为 title 的工作表，返回可以 append 的写入对象。"""
+        return _SheetWriter(_create_xlsx_sheet(self._workbook, title, columns), columns)
+
+    def close(self):
+        self._workbook.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_columns(path, file_format=None, sheet=None):
+    """根据表头判断表格的列：含有出现位置列的去重表格返回 DEDUP_COLUMNS，否则返回 COLUMNS。"""
+    file_format = file_format or table_format(path)
+    if file_format == "xlsx":
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            worksheet = workbook[sheet] if sheet in workbook.sheetnames else workbook.worksheets[0]
+            header = next(worksheet.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+    elif file_format in ("csv", "tsv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            header = next(csv.reader(f, delimiter="," if file_format == "csv" else "\t"), [])
+    elif file_format == "jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            line = f.readline()
+        header = list(json.loads(line)) if line.strip() else []
+    else:
+        _, parquet = _import_pyarrow()
+        header = parquet.ParquetFile(path).schema_arrow.names
+    return DEDUP_COLUMNS if DEDUP_COLUMNS[-1] in header else COLUMNS
+
+
+def iter_rows(path, file_format=None, sheet=None, columns=COLUMNS):
+    """
+    逐行读取表格（跳过表头），生成补齐为 len(columns) 列的行；columns 为 DEDUP_COLUMNS 时普通表格的追加列为空。
+    xlsx 默认读取第一个工作表，sheet 不为空时读取该名称的工作表；其他格式只有一个表格，不能指定 sheet。
+    """
+    file_format = file_format or table_format(path)
+    width = len(columns)
+    if sheet is not None and file_format != "xlsx":
+        raise ValueError(f"只有 xlsx 支持多个工作表：{path}")
+    if file_format == "xlsx":
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            if sheet is not None and sheet not in workbook.sheetnames:
+                raise KeyError(f"{path} 中没有名为 {sheet} 的工作表")
+            worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+            for row in worksheet.iter_rows(min_row=2, values_only=True):
+                yield normalize_row(row, width)
+        finally:
+            workbook.close()
+    elif file_format in ("csv", "tsv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f, delimiter="," if file_format == "csv" else "\t")
+            next(reader, None)
+            for row in reader:
+                yield normalize_row(row, width)
+    elif file_format == "jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield normalize_row([record.get(name) for name in columns], width)
+    elif file_format == "parquet":
+        _, parquet = _import_pyarrow()
+        parquet_file = parquet.ParquetFile(path)
+        present = [name for name in columns if name in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_ROWS, columns=present):
+            for record in batch.to_pylist():
+                yield normalize_row([record.get(name) for name in columns], width)
+
+
+def convert(source, target):
+    """在任意两种支持的格式之间转换（保留去重表格的追加列），返回转换的行数。"""
+    columns = read_columns(source)
+    with TableWriter(target, columns=columns) as writer:
+        for row in iter_rows(source, columns=columns):
+            writer.append(row)
+    return writer.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在 xlsx、csv、tsv、jsonl、parquet 之间转换翻译表格（按扩展名判断格式）。")
+    parser.add_argument("source", help="输入文件，例如 chinese.csv")
+    parser.add_argument("target", help="输出文件，例如 chinese.xlsx")
+    args = parser.parse_args()
+
+    count = convert(args.source, args.target)
+    print(f"已将 {count} 行从 {args.source} 转换到 {args.target}")
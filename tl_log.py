@@ -0,0 +1,106 @@
+import logging
+from tqdm import tqdm
+
+# 三个脚本共用的日志层。
+# 主进程通过标准 logging 输出；工作进程不直接输出，而是把日志写入 LogBuffer，
+# 随处理结果一起返回，由主进程逐个文件统一输出，避免多进程输出交错和频繁的终端 I/O。
+# 默认级别 INFO 只输出每个文件的摘要和总计，DEBUG（--verbose）输出逐行的完整记录。
+
+LOGGER_NAME = "renpy_tl"
+
+# 工作进程中 LogBuffer 的默认级别，由 init_worker_logging 在进程池初始化时设置
+_worker_level = logging.INFO
+
+
+def get_logger(name):
+    """返回各脚本使用的日志记录器，例如 get_logger("import")。"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class _TqdmHandler(logging.StreamHandler):
+    """通过 tqdm.write 输出，不会打断正在显示的进度条。"""
+
+    def emit(self, record):
+        try:
+            tqdm.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(verbose=False, log_file=None):
+    """
+    配置日志输出：verbose 为 True 时输出 DEBUG 级别的完整记录，否则只输出摘要（INFO 及以上）。
+    log_file 不为空时，同时把完整记录（DEBUG）写入该文件。返回主进程使用的级别。
+    """
+    level = logging.DEBUG if verbose else logging.INFO
+    root = logging.getLogger(LOGGER_NAME)
+    root.handlers.clear()
+    root.propagate = False
+
+    console = _TqdmHandler()
+    console.setLevel(level)
+    console.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s %(message)s"))
+    root.addHandler(console)
+
+    if log_file:
+        file_handler = logging.FileHandler(log_file, mode="w", encoding="utf-8")
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s %(name)s %(message)s"))
+        root.addHandler(file_handler)
+        level = logging.DEBUG
+
+    root.setLevel(level)
+    return level
+
+
+def effective_level():
+    """主进程当前需要的最低日志级别，传给工作进程以便在源头丢弃不需要的记录。"""
+    return logging.getLogger(LOGGER_NAME).getEffectiveLevel()
+
+
+def init_worker_logging(level):
+    """进程池初始化函数：设置工作进程中 LogBuffer 的默认级别。"""
+    global _worker_level
+    _worker_level = level
+
+
+class LogBuffer:
+    """
+    工作进程中的日志缓冲，接口与 logging.Logger 相同（debug/info/warning/error）。
+    低于级别的记录在格式化之前就被丢弃；records 为可序列化的 (级别, 消息) 列表。
+    """
+
+    def __init__(self, level=None):
+        self.level = _worker_level if level is None else level
+        self.records = []
+
+    def isEnabledFor(self, level):
+        return level >= self.level
+
+    def log(self, level, msg, *args):
+        if level >= self.level:
+            self.records.append((level, msg % args if args else msg))
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(logging.ERROR, msg, *args)
+
+
+def replay(logger, records):
+    """在主进程中输出工作进程返回的日志记录。"""
+    for level, message in records:
+        logger.log(level, message)
+
+
+def add_logging_arguments(parser):
+    """为命令行添加 --verbose 与 --log-file 参数。"""
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出逐行的完整处理记录（默认只输出每个文件的摘要和总计）")
+    parser.add_argument("--log-file", default=None, help="同时把完整处理记录写入该文件")
@@ -0,0 +1,8 @@
+import os
+
+# 三个脚本共用的游戏目录查找。
+
+
+def list_languages(tl_folder):
+    """返回 game/tl 下的全部语言文件夹名称。"""
+    return sorted(name for name in os.listdir(tl_folder) if os.path.isdir(os.path.join(tl_folder, name)))
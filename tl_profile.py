@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import contextlib
+import datetime
+import multiprocessing
+from collections import defaultdict
+
+# 三个脚本共用的可选性能剖析。
+# 启用后记录主进程各阶段（遍历目录、读取/保存工作簿、等待工作进程等）的耗时，
+# 以及工作进程中每个文件各阶段（读取、解析、匹配、写入）的耗时和匹配数，最后写出 JSON 报告并列出最慢的文件。
+# 每个文件的统计与日志一样随处理结果返回主进程。未启用时各计时点只是空操作。
+# 另外可以让主进程和每个工作进程各自把 cProfile 数据写入指定目录，用 pstats 或 snakeviz 查看。
+
+# 工作进程中的设置，由 init_worker_profiling 在进程池初始化时设置
+_worker_enabled = False
+_worker_cprofile = None  # (cProfile.Profile, 输出文件)
+
+
+class _NullPhase:
+    """未启用剖析时使用的空计时点。"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    """把 with 块的耗时累加到 totals[name]。"""
+
+    __slots__ = ("totals", "name", "start")
+
+    def __init__(self, totals, name):
+        self.totals = totals
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.totals[self.name] += time.perf_counter() - self.start
+        return False
+
+
+def _rounded(values):
+    return {name: round(value, 6) for name, value in values.items()}
+
+
+class FileProfile:
+    """
+    单个文件的剖析统计，在工作进程中使用。
+    phase(name) 为各阶段计时，count(name, n) 记录匹配数等计数；result() 返回可序列化的字典，未启用时返回 None。
+    """
+
+    def __init__(self, path, enabled=None):
+        self.enabled = _worker_enabled if enabled is None else enabled
+        if self.enabled:
+            self.path = path
+            self.start = time.perf_counter()
+            self.phases = defaultdict(float)
+            self.counts = {}
+
+    def phase(self, name):
+        return _Phase(self.phases, name) if self.enabled else _NULL_PHASE
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def result(self):
+        if not self.enabled:
+            return None
+        return {
+            "file": self.path,
+            "seconds": round(time.perf_counter() - self.start, 6),
+            "phases": _rounded(self.phases),
+            "counts": self.counts,
+        }
+
+
+class Profiler:
+    """
+    主进程中的剖析器。report_file 不为空时启用阶段计时并在 finish 时写出 JSON 报告；
+    cprofile_dir 不为空时主进程和每个工作进程各自写出 cProfile 数据。
+    """
+
+    def __init__(self, script, report_file=None, top=10, cprofile_dir=None):
+        self.script = script
+        self.report_file = report_file
+        self.enabled = report_file is not None
+        self.top = top
+        self.cprofile_dir = cprofile_dir
+        self.phases = defaultdict(float)
+        self.worker_phases = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.files = []
+        self._start = None
+        self._cprofile = None
+
+    def phase(self, name):
+        """主进程阶段计时：with profiler.phase("walk"): ..."""
+        return _Phase(self.phases, name) if self.enabled else _NULL_PHASE
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counters[name] += value
+
+    def iterate(self, iterable, name):
+        """逐项迭代 iterable，把等待每一项的耗时累加到阶段 name，例如等待工作进程返回结果。"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        try:
+            while True:
+                with self.phase(name):
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            # 提前结束时同时结束被包装的生成器（例如关闭其中的进程池）
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    def add_worker_phase(self, name, seconds):
+        """记录不属于单个文件的工作进程耗时，例如进程初始化。"""
+        if self.enabled:
+            self.worker_phases[name] += seconds
+
+    def add_file(self, stats):
+        """收集工作进程返回的单个文件统计（FileProfile.result() 的结果）。"""
+        if stats is None:
+            return
+        self.files.append(stats)
+        for name, seconds in stats["phases"].items():
+            self.worker_phases[name] += seconds
+
+    def worker_options(self):
+        """传给进程池初始化函数 init_worker_profiling 的参数。"""
+        return self.enabled, self.cprofile_dir, self.script
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self.cprofile_dir:
+            os.makedirs(self.cprofile_dir, exist_ok=True)
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def finish(self, logger):
+        """停止计时，写出 cProfile 数据和 JSON 报告，并输出最慢的文件。"""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            main_file = os.path.join(self.cprofile_dir, f"{self.script}-main.prof")
+            self._cprofile.dump_stats(main_file)
+            logger.info("cProfile 数据已写入 %s（工作进程为 %s-worker-<pid>.prof）。", self.cprofile_dir, self.script)
+        if not self.enabled:
+            return
+
+        files = sorted(self.files, key=lambda stats: stats["seconds"], reverse=True)
+        report = {
+            "script": self.script,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "total_seconds": round(time.perf_counter() - self._start, 6) if self._start is not None else None,
+            "phases": _rounded(self.phases),
+            "worker_phases": _rounded(self.worker_phases),
+            "counters": dict(self.counters),
+            "slowest": [stats["file"] for stats in files[:self.top]],
+            "files": files,
+        }
+        with open(self.report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        logger.info("主进程各阶段耗时：%s", ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items()))
+        logger.info("工作进程各阶段耗时（累计）：%s",
+                    ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.worker_phases.items()))
+        if files:
+            logger.info("最慢的 %d 个文件：", min(self.top, len(files)))
+            for stats in files[:self.top]:
+                details = ", ".join([f"{name} {seconds:.3f}s" for name, seconds in stats["phases"].items()] +
+                                    [f"{name}={value}" for name, value in stats["counts"].items()])
+                logger.info("  %8.3f 秒  %s  (%s)", stats["seconds"], stats["file"], details)
+        logger.info("剖析报告已保存到 %s", self.report_file)
+
+
+def init_worker_profiling(options):
+    """
+    进程池初始化函数：设置工作进程的剖析选项（Profiler.worker_options() 的结果）。
+    任务在主进程中直接处理时也会调用，此时主进程的 cProfile 已经覆盖这些任务，不再单独采样。
+    """
+    global _worker_enabled, _worker_cprofile
+    enabled, cprofile_dir, script = options
+    _worker_enabled = enabled
+    if multiprocessing.parent_process() is None:
+        return
+    # fork 出的工作进程会继承主进程正在运行的 cProfile，先将其停止
+    sys.setprofile(None)
+    if cprofile_dir:
+        _worker_cprofile = (cProfile.Profile(), os.path.join(cprofile_dir, f"{script}-worker-{os.getpid()}.prof"))
+
+
+@contextlib.contextmanager
+def worker_task():
+    """
+    包住工作进程中的一个任务：设置了 cProfile 时在任务期间采样，并在任务结束后更新本进程的 cProfile 文件。
+    进程池可能直接终止工作进程，因此不等到进程退出时才写文件。
+    """
+    if _worker_cprofile is None:
+        yield
+        return
+    profile, output_file = _worker_cprofile
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(output_file)
+
+
+def add_profiling_arguments(parser):
+    """为命令行添加 --profile、--profile-top 与 --cprofile 参数。"""
+    parser.add_argument("--profile", metavar="REPORT", default=None,
+                        help="启用性能剖析，把各阶段耗时和每个文件的耗时写入该 JSON 报告")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N", help="报告中列出最慢的 N 个文件（默认 10）")
+    parser.add_argument("--cprofile", metavar="DIR", default=None,
+                        help="主进程和每个工作进程各自把 cProfile 数据写入该目录")
+
+
+def profiler_from_args(script, args):
+    """根据命令行参数创建 Profiler。"""
+    return Profiler(script, report_file=args.profile, top=args.profile_top, cprofile_dir=args.cprofile)
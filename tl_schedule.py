@@ -0,0 +1,105 @@
+import multiprocessing
+from collections import namedtuple
+
+# 三个脚本共用的任务调度。
+# 按输入大小从大到小排序，最大的文件最先开始，避免最后只剩一个进程在处理排在后面的大文件；
+# 小文件合并为开销相近的批次，减少每个任务的进程间通信开销；
+# 总输入很小时直接在当前进程中处理，省去启动进程池的开销。
+
+# 总输入小于该值（字节）时不启动进程池
+SERIAL_THRESHOLD_BYTES = 1024 * 1024
+# 估算开销时每个文件额外计入的字节数（打开文件、分词器初始化、返回结果等固定开销）
+FILE_OVERHEAD_BYTES = 4096
+# 未指定批次大小时，每个进程大约分到的批次数
+BATCHES_PER_WORKER = 4
+
+# processes 为进程数（0 表示在当前进程中处理），batches 为各批的任务下标列表，按开销从大到小排列
+SchedulePlan = namedtuple("SchedulePlan", "processes batches")
+
+
+def plan_batches(costs, workers, batch_bytes=None):
+    """
+    按开销从大到小把任务分批，返回各批的任务下标列表。
+    开销不小于 batch_bytes 的任务单独成批，其余任务依次装入，每批累计到 batch_bytes 为止。
+    """
+    if batch_bytes is None:
+        batch_bytes = max(1, sum(costs) // (workers * BATCHES_PER_WORKER))
+    batches = []
+    current, current_bytes = [], 0
+    for index in sorted(range(len(costs)), key=costs.__getitem__, reverse=True):
+        if costs[index] >= batch_bytes:
+            batches.append([index])
+            continue
+        current.append(index)
+        current_bytes += costs[index]
+        if current_bytes >= batch_bytes:
+            batches.append(current)
+            current, current_bytes = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def plan_schedule(sizes, workers=None, batch_bytes=None, serial_threshold=None):
+    """
+    根据各任务的输入大小（字节）制定调度计划。
+    workers 默认为 CPU 核心数；总输入小于 serial_threshold（默认 SERIAL_THRESHOLD_BYTES）或只有一个进程时在当前进程中处理。
+    """
+    workers = workers or multiprocessing.cpu_count()
+    serial_threshold = SERIAL_THRESHOLD_BYTES if serial_threshold is None else serial_threshold
+    if not sizes:
+        return SchedulePlan(0, [])
+    if workers <= 1 or len(sizes) == 1 or sum(sizes) < serial_threshold:
+        return SchedulePlan(0, [list(range(len(sizes)))])
+    batches = plan_batches([size + FILE_OVERHEAD_BYTES for size in sizes], workers, batch_bytes)
+    return SchedulePlan(max(1, min(workers, len(batches))), batches)
+
+
+def describe_plan(plan):
+    """返回调度计划的简短说明，用于日志。"""
+    tasks = sum(len(batch) for batch in plan.batches)
+    if not plan.processes:
+        return f"在当前进程中处理 {tasks} 个文件"
+    return f"使用 {plan.processes} 个进程处理 {tasks} 个文件，共 {len(plan.batches)} 批（从大到小）"
+
+
+def _run_batch(args):
+    func, indexed_tasks = args
+    return [(index, func(task)) for index, task in indexed_tasks]
+
+
+def run_scheduled(func, tasks, plan, initializer=None, initargs=()):
+    """
+    按调度计划对 tasks 中的每一项执行 func，生成 (任务下标, 结果)。
+    使用进程池时结果按完成顺序返回；在当前进程中处理时按原顺序返回，
+    此时同样会先调用 initializer，使 func 看到与工作进程中相同的全局状态。
+    """
+    if not plan.processes:
+        if plan.batches and initializer is not None:
+            initializer(*initargs)
+        for batch in plan.batches:
+            for index in batch:
+                yield index, func(tasks[index])
+        return
+    batches = [(func, [(index, tasks[index]) for index in batch]) for batch in plan.batches]
+    with multiprocessing.Pool(plan.processes, initializer, initargs) as pool:
+        for results in pool.imap_unordered(_run_batch, batches):
+            yield from results
+
+
+def add_schedule_arguments(parser):
+    """为命令行添加 --workers、--batch-kb 与 --serial-kb 参数。"""
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为 CPU 核心数")
+    parser.add_argument("--batch-kb", type=int, default=None,
+                        help="小文件合并成批时每批的目标大小（KB），默认按总大小和进程数自动计算")
+    parser.add_argument("--serial-kb", type=int, default=SERIAL_THRESHOLD_BYTES // 1024,
+                        help=f"全部输入文件小于该大小（KB）时不启动进程池，默认 {SERIAL_THRESHOLD_BYTES // 1024}")
+
+
+def schedule_options(args):
+    """把命令行参数转换为 plan_schedule 的关键字参数。"""
+    return {
+        "workers": args.workers,
+        "batch_bytes": args.batch_kb * 1024 if args.batch_kb else None,
+        "serial_threshold": args.serial_kb * 1024,
+    }
@@ -0,0 +1,164 @@
+import os
+import json
+import multiprocessing
+from tl_formats import TableWriter, COLUMNS, table_format
+from tl_schedule import plan_schedule, run_scheduled
+
+# 分片表格：把一种语言的翻译拆成多个较小的表格（分片），由多个进程同时写入和读取，
+# 并用索引文件记录各分片。分片只在源文件的边界处切分，同一个源文件的行总在同一个分片中。
+# 单个 xlsx 工作表最多 1,048,576 行，大型游戏拆分后既不会超出限制，保存也不再是单进程的一次长时间操作。
+
+# 默认每个分片的行数（在源文件边界处切分，实际行数可能略多）
+SHARD_ROWS = 100000
+# 索引文件的后缀，例如 chinese.xlsx 的分片为 chinese.001.xlsx ……，索引为 chinese.shards.json
+INDEX_SUFFIX = ".shards.json"
+INDEX_VERSION = 1
+# 接收行的同时（export.py 的解析进程池仍在运行）ShardWriter 最多同时保存的分片数；close 时改用全部 workers 个进程
+WRITER_PROCESSES = 2
+
+
+def shard_index_path(path):
+    """返回表格 path 对应的分片索引文件名。"""
+    return os.path.splitext(path)[0] + INDEX_SUFFIX
+
+
+def is_shard_index(path):
+    return path.endswith(INDEX_SUFFIX)
+
+
+def shard_path(path, number):
+    """返回表格 path 的第 number 个分片的文件名（从 1 开始）。"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{number:03d}{ext}"
+
+
+def read_shard_index(index_file):
+    """读取分片索引，返回各分片的路径（相对于索引文件所在目录解析）。"""
+    with open(index_file, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != INDEX_VERSION:
+        raise ValueError(f"不支持的分片索引版本：{index_file}")
+    directory = os.path.dirname(index_file)
+    return [os.path.join(directory, shard["file"]) for shard in index["shards"]]
+
+
+def _write_shard(args):
+    path, file_format, columns, rows = args
+    with TableWriter(path, file_format, columns) as writer:
+        for row in rows:
+            writer.append(row)
+    return writer.rows_written
+
+
+class ShardWriter:
+    """
+    分片写入，接口与 TableWriter 相同。path 为不分片时的文件名（例如 chinese.xlsx），分片为 chinese.001.xlsx ……
+    行数达到 shard_rows 后，在下一个源文件（定位列中的文件名）开始时切分。接收行期间调用方的解析进程池通常仍在运行，
+    写满的分片交给最多 min(workers, WRITER_PROCESSES) 个后台进程保存，其余的分片排队；close 时（解析已经结束）
+    排队的分片和最后一个分片由 workers 个进程同时保存（减去仍在运行的后台进程），只剩一个分片或 workers 为 1 时在当前进程中保存。
+    进程池以 spawn 方式启动，不会从已有进程池线程的主进程 fork。close 时等待全部分片保存完毕，
+    写出索引文件，并删除上一次导出留下、本次不再使用的分片。
+    """
+
+    def __init__(self, path, file_format=None, columns=COLUMNS, shard_rows=SHARD_ROWS, workers=None):
+        self.path = path
+        self.format = file_format or table_format(path)
+        self.columns = list(columns)
+        self.shard_rows = shard_rows
+        self.workers = workers or multiprocessing.cpu_count()
+        self.rows_written = 0
+        self._rows = []
+        self._sources = []  # 当前分片中的源文件，按出现顺序
+        self._shards = []  # 索引中的分片条目
+        self._queued = []  # 写满但还没有交给进程池的分片（_write_shard 的参数）
+        self._pending = []  # 后台进程池中的保存任务
+        self._pool = None
+
+    def append(self, row):
+        location = row[4]
+        source = location.split(":")[0] if location else None
+        if not self._sources or self._sources[-1] != source:
+            if len(self._rows) >= self.shard_rows:
+                self._submit()
+            self._sources.append(source)
+        self._rows.append(row)
+        self.rows_written += 1
+
+    def _cut(self):
+        """结束当前分片，返回其 _write_shard 参数。"""
+        path = shard_path(self.path, len(self._shards) + 1)
+        self._shards.append({
+            "file": os.path.basename(path),
+            "rows": len(self._rows),
+            "sources": [source for source in dict.fromkeys(self._sources) if source],
+        })
+        args = (path, self.format, self.columns, self._rows)
+        self._rows, self._sources = [], []
+        return args
+
+    def _submit(self):
+        if self.workers <= 1:
+            _write_shard(self._cut())
+            return
+        self._queued.append(self._cut())
+        background = min(self.workers, WRITER_PROCESSES)
+        if self._pool is None:
+            self._pool = multiprocessing.get_context("spawn").Pool(background)
+        running = sum(1 for result in self._pending if not result.ready())
+        while self._queued and running < background:
+            self._pending.append(self._pool.apply_async(_write_shard, (self._queued.pop(0),)))
+            running += 1
+
+    def close(self):
+        if self._rows or not self._shards:
+            self._queued.append(self._cut())
+        try:
+            running = sum(1 for result in self._pending if not result.ready())
+            processes = min(len(self._queued), max(1, self.workers - running))
+            if processes <= 1:
+                for args in self._queued:
+                    _write_shard(args)
+            else:
+                with multiprocessing.get_context("spawn").Pool(processes) as pool:
+                    pool.map(_write_shard, self._queued, chunksize=1)
+            self._queued = []
+            for result in self._pending:
+                result.get()
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+
+        index_file = shard_index_path(self.path)
+        try:
+            stale = set(read_shard_index(index_file))
+        except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+            stale = set()
+        temp_file = index_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "format": self.format, "columns": self.columns,
+                       "rows": self.rows_written, "shards": self._shards}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, index_file)
+        stale -= {os.path.join(os.path.dirname(index_file), shard["file"]) for shard in self._shards}
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def map_tables(func, tasks, paths, workers=None, serial_threshold=None, initializer=None, initargs=()):
+    """
+    对每个表格（分片）执行 func(task)，按 tasks 的顺序返回结果列表；paths 为各任务对应的表格文件，用于按大小调度。
+    每个表格单独成批，最大的最先开始；只有一个表格或总大小小于 serial_threshold 时在当前进程中处理（见 tl_schedule）。
+    """
+    sizes = [os.path.getsize(path) for path in paths]
+    plan = plan_schedule(sizes, workers, batch_bytes=1, serial_threshold=serial_threshold)
+    results = [None] * len(tasks)
+    for index, result in run_scheduled(func, tasks, plan, initializer, initargs):
+        results[index] = result
+    return results
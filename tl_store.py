@@ -0,0 +1,211 @@
+import sqlite3
+import argparse
+from tl_formats import TableWriter, iter_rows, normalize_row, parse_occurrences, DEDUP_COLUMNS
+
+# 可选的 SQLite 翻译库。
+# export.py --store 把每个翻译文件的行写入翻译库，表格由翻译库生成（dump），译者修改后再读回翻译库（load）；
+# import.py --store 直接查询翻译库，不再读取整张表格，--changed-only 时只处理上次导入之后有改动的行所在的文件。
+# 每行记录最后一次改动的版本号；每次写入翻译库（导出、读回表格）使用一个新的版本号，内容没有变化的行保持原版本号。
+# 从表格读回、尚未导入的译文标记为 pending，在导入之前再次导出时不会被翻译文件中的旧译文覆盖。
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS rows (
+    id INTEGER PRIMARY KEY,
+    language TEXT NOT NULL,
+    source TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    prefix TEXT,
+    original TEXT,
+    translation TEXT,
+    special TEXT,
+    location TEXT,
+    identifier TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    pending INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS rows_identifier ON rows (language, identifier);
+CREATE INDEX IF NOT EXISTS rows_original ON rows (language, original);
+CREATE INDEX IF NOT EXISTS rows_source ON rows (language, source, position);
+CREATE INDEX IF NOT EXISTS rows_version ON rows (language, version);
+"""
+
+
+class TranslationStore:
+    """
+    翻译库。每行属于一种语言的一个翻译文件（source，相对于 game/tl/<语言> 的路径），position 为其在文件中的顺序。
+    修改在 commit 时提交；也可以用作上下文管理器，正常结束时提交并关闭。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+        schema = self._meta("schema")
+        if schema is None:
+            self._set_meta("schema", SCHEMA_VERSION)
+        elif schema != SCHEMA_VERSION:
+            raise ValueError(f"不支持的翻译库版本：{path}")
+        self._version = None
+
+    def _meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def version(self):
+        """翻译库当前的版本号（最后一次改动的版本）。"""
+        return self._meta("version", 0)
+
+    def _next_version(self):
+        """本次写入使用的版本号；只有确实改动了行（_touch）时才记入翻译库。"""
+        if self._version is None:
+            self._version = self.version + 1
+        return self._version
+
+    def _touch(self):
+        self._set_meta("version", self._next_version())
+
+    def replace_file(self, language, source, rows):
+        """
+        用导出得到的行（六列）替换一个翻译文件的全部行，返回改动的行数。
+        按 (标识, 原文) 与已有的行对应：前缀或译文变化的行使用新版本号，只有顺序或定位变化的行保持原版本号；
+        已有行的“特殊”列和尚未导入的译文（pending）保留。文件中已不存在的行被删除。
+        """
+        existing = {}
+        for row in self.db.execute("SELECT id, prefix, translation, location, position, pending, identifier, original "
+                                   "FROM rows WHERE language = ? AND source = ? ORDER BY position", (language, source)):
+            existing.setdefault((row[6], row[7]), []).append(row[:6])
+        changed = 0
+        for position, row in enumerate(rows):
+            prefix, original, translation, _, location, identifier = normalize_row(row)
+            identifier = identifier or ""
+            matches = existing.get((identifier, original))
+            if not matches:
+                self.db.execute("INSERT INTO rows (language, source, position, prefix, original, translation, location, "
+                                "identifier, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (language, source, position, prefix, original, translation, location, identifier,
+                                 self._next_version()))
+                self._touch()
+                changed += 1
+                continue
+            row_id, old_prefix, old_translation, old_location, old_position, pending = matches.pop(0)
+            if pending:
+                translation = old_translation
+            if (old_prefix, old_translation) != (prefix, translation):
+                self.db.execute("UPDATE rows SET prefix = ?, translation = ?, location = ?, position = ?, version = ? "
+                                "WHERE id = ?", (prefix, translation, location, position, self._next_version(), row_id))
+                self._touch()
+                changed += 1
+            elif (old_location, old_position) != (location, position):
+                self.db.execute("UPDATE rows SET location = ?, position = ? WHERE id = ?", (location, position, row_id))
+        stale = [(row[0],) for matches in existing.values() for row in matches]
+        self.db.executemany("DELETE FROM rows WHERE id = ?", stale)
+        return changed + len(stale)
+
+    def remove_missing(self, language, sources):
+        """删除不在 sources 中的翻译文件的行（翻译文件已被删除），返回删除的行数。"""
+        sources = set(sources)
+        missing = [(language, source) for (source,) in
+                   self.db.execute("SELECT DISTINCT source FROM rows WHERE language = ?", (language,)) if source not in sources]
+        removed = 0
+        for params in missing:
+            removed += self.db.execute("DELETE FROM rows WHERE language = ? AND source = ?", params).rowcount
+        return removed
+
+    def iter_rows(self, language, sources=None):
+        """按文件、再按文件内顺序生成六列的行；sources 不为空时只包含这些翻译文件。"""
+        columns = "prefix, original, translation, special, location, identifier"
+        if sources is None:
+            yield from self.db.execute(f"SELECT {columns} FROM rows WHERE language = ? ORDER BY source, position", (language,))
+            return
+        for source in sorted(sources):
+            yield from self.db.execute(f"SELECT {columns} FROM rows WHERE language = ? AND source = ? ORDER BY position",
+                                       (language, source))
+
+    def iter_strings(self, language):
+        """生成全部 strings 行（六列），顺序与 iter_rows 相同。"""
+        return self.db.execute("SELECT prefix, original, translation, special, location, identifier FROM rows "
+                               "WHERE language = ? AND identifier = '' ORDER BY source, position", (language,))
+
+    def changed_sources(self, language, since):
+        """返回版本号大于 since 的行所在的翻译文件。"""
+        return {source for (source,) in self.db.execute(
+            "SELECT DISTINCT source FROM rows WHERE language = ? AND version > ?", (language, since))}
+
+    def load_table(self, language, path, sheet=None):
+        """
+        把译者修改后的表格读回翻译库：对话行按标识、strings 行按定位和原文对应，
+        译文或“特殊”列变化的行使用新版本号。去重表格中的一行会写入其列出的每一处出现。返回改动的行数。
+        """
+        changed = 0
+        for row in iter_rows(path, sheet=sheet, columns=DEDUP_COLUMNS):
+            prefix, original, translation, special, location, identifier, _, occurrences = row
+            for occurrence_location, occurrence_identifier in parse_occurrences(occurrences) or [(location, identifier)]:
+                if occurrence_identifier:
+                    where, params = "identifier = ?", (occurrence_identifier,)
+                else:
+                    where, params = "identifier = '' AND location = ? AND original = ?", (occurrence_location, original)
+                updated = self.db.execute(
+                    f"UPDATE rows SET translation = ?, special = ?, version = ?, pending = 1 WHERE language = ? AND {where} "
+                    "AND (translation IS NOT ? OR special IS NOT ?)",
+                    (translation, special, self._next_version(), language) + params + (translation, special)).rowcount
+                if updated:
+                    self._touch()
+                    changed += updated
+        return changed
+
+    def dump_table(self, language, path, sources=None):
+        """把一种语言的行写入表格（格式由扩展名决定），返回写入的行数。"""
+        with TableWriter(path) as writer:
+            for row in self.iter_rows(language, sources):
+                writer.append(row)
+        return writer.rows_written
+
+    def last_import(self, language):
+        """上次导入该语言时翻译库的版本号，从未导入时为 0。"""
+        return self._meta(f"imported:{language}", 0)
+
+    def mark_imported(self, language, version):
+        """记录导入完成时翻译库的版本号；此前读回的译文都已写入翻译文件，不再是 pending。"""
+        self._set_meta(f"imported:{language}", version)
+        self.db.execute("UPDATE rows SET pending = 0 WHERE language = ? AND pending = 1", (language,))
+
+    def commit(self):
+        self.db.commit()
+        self._version = None
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在 SQLite 翻译库和表格之间转换（表格格式按扩展名判断）。")
+    parser.add_argument("action", choices=["dump", "load"], help="dump：由翻译库生成表格；load：把修改后的表格读回翻译库")
+    parser.add_argument("store", help="翻译库文件，例如 translations.sqlite")
+    parser.add_argument("language", help="语言文件夹名称，例如 chinese")
+    parser.add_argument("table", help="表格文件，例如 chinese.xlsx")
+    parser.add_argument("--since-import", action="store_true", help="dump 时只包含上次导入之后有改动的文件")
+    args = parser.parse_args()
+
+    with TranslationStore(args.store) as store:
+        if args.action == "dump":
+            sources = store.changed_sources(args.language, store.last_import(args.language)) if args.since_import else None
+            count = store.dump_table(args.language, args.table, sources)
+            print(f"已将 {count} 行从 {args.store} 写入 {args.table}")
+        else:
+            count = store.load_table(args.language, args.table)
+            print(f"已从 {args.table} 读回 {count} 行改动（翻译库版本 {store.version}）")